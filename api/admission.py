@@ -0,0 +1,207 @@
+# api/admission.py
+"""
+Admission control in front of the query engine.
+
+- at most QUERY_CONCURRENCY queries execute; the rest wait in a bounded queue
+  (QUERY_QUEUE_MAX) instead of all hitting Ollama at once
+- two priority classes: "interactive" (chat UI) before "batch" (API callers);
+  every BATCH_EVERY-th slot goes to batch when both wait, so batch never starves.
+  The class is decided by the server (chat turns are interactive); a client can
+  only lower it, since the headers are not authenticated beyond the shared key
+- per client round-robin inside a class (client_key: the client address; the
+  API key is shared by all callers): one noisy client can't fill all slots.
+  X-Client-Id is honoured only from TRUSTED_PROXIES, which set it themselves;
+  from anyone else it would let one caller open as many queues as it likes
+- a client deadline can only shorten the class deadline (DEADLINES), not extend it
+- a request is rejected up front (Overloaded -> 429 + Retry-After) when the
+  queue is full or its estimated wait exceeds its deadline; one that still
+  waits past its deadline is rejected the same way
+- stats(): queue length per class, running, admitted/rejected, wait times
+  (also on /metrics as opal_admission_*)
+
+The wait estimate is (requests ahead + 1) / concurrency * EWMA of query time.
+"""
+import os
+import math
+import time
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional
+
+from telemetry.metrics import gauge_lines, register_collector
+
+QUERY_CONCURRENCY = int(os.getenv("QUERY_CONCURRENCY", "2"))
+QUERY_QUEUE_MAX = int(os.getenv("QUERY_QUEUE_MAX", "32"))   # keep below the threadpool size (40)
+BATCH_EVERY = 4
+PRIORITIES = ("interactive", "batch")
+DEADLINES = {
+    "interactive": float(os.getenv("QUERY_DEADLINE_INTERACTIVE", "30")),
+    "batch": float(os.getenv("QUERY_DEADLINE_BATCH", "120")),
+}
+INITIAL_SERVICE_SECONDS = 5.0
+EWMA_ALPHA = 0.2
+
+
+CLIENT_ID_MAX = 64
+# addresses of reverse proxies allowed to set X-Client-Id (comma separated)
+TRUSTED_PROXIES = {h.strip() for h in os.getenv("TRUSTED_PROXIES", "").split(",") if h.strip()}
+
+
+def client_key(client_id: Optional[str], host: Optional[str]) -> str:
+    """Round-robin key for a request: the client address, or X-Client-Id when
+    the request comes from a trusted proxy."""
+    client_id = (client_id or "").strip()[:CLIENT_ID_MAX]
+    if client_id and host in TRUSTED_PROXIES:
+        return f"id:{client_id}"
+    return f"ip:{host or 'unknown'}"
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class _Ticket:
+    __slots__ = ("key", "priority", "enqueued", "granted")
+
+    def __init__(self, key: str, priority: str):
+        self.key = key
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.granted = threading.Event()
+
+
+class AdmissionController:
+    def __init__(self, concurrency: int = QUERY_CONCURRENCY, queue_max: int = QUERY_QUEUE_MAX):
+        self.concurrency = concurrency
+        self.queue_max = queue_max
+        self._lock = threading.Lock()
+        # priority -> api key -> waiting tickets (key order = round-robin order)
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Ticket]]"] = {p: OrderedDict() for p in PRIORITIES}
+        self._running = 0
+        self._dispatched = 0
+        self._service = INITIAL_SERVICE_SECONDS
+        self._waits: Deque[float] = deque(maxlen=500)
+        self.counters = {"admitted": 0, "rejected_full": 0, "rejected_estimate": 0, "rejected_deadline": 0}
+
+    # --- queue bookkeeping (lock held) ---
+
+    def _waiting(self, priority: Optional[str] = None) -> int:
+        prios = [priority] if priority else PRIORITIES
+        return sum(len(q) for p in prios for q in self._queues[p].values())
+
+    def _ahead(self, priority: str) -> int:
+        if priority == "interactive":
+            return self._waiting("interactive")
+        return self._waiting()
+
+    def _estimate(self, priority: str) -> float:
+        if self._running < self.concurrency and not self._waiting():
+            return 0.0
+        return (self._ahead(priority) + 1) / self.concurrency * self._service
+
+    def _pop_next(self) -> Optional[_Ticket]:
+        order = list(PRIORITIES)
+        if self._dispatched % BATCH_EVERY == BATCH_EVERY - 1:
+            order.reverse()
+        for p in order:
+            queue = self._queues[p]
+            if not queue:
+                continue
+            key, tickets = next(iter(queue.items()))
+            ticket = tickets.popleft()
+            queue.pop(key)
+            if tickets:
+                queue[key] = tickets  # back of the round-robin
+            return ticket
+        return None
+
+    def _dispatch(self):
+        while self._running < self.concurrency:
+            ticket = self._pop_next()
+            if ticket is None:
+                return
+            self._running += 1
+            self._dispatched += 1
+            self._waits.append(time.monotonic() - ticket.enqueued)
+            ticket.granted.set()
+
+    def _remove(self, ticket: _Ticket) -> bool:
+        tickets = self._queues[ticket.priority].get(ticket.key)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                self._queues[ticket.priority].pop(ticket.key)
+            return True
+        return False
+
+    # --- public ---
+
+    @contextmanager
+    def admit(self, key: str, priority: str = "batch", deadline: Optional[float] = None) -> Iterator[None]:
+        """Hold one execution slot for the duration of the with-block, or raise Overloaded."""
+        priority = priority if priority in PRIORITIES else "batch"
+        # clients may ask for a shorter wait, never a longer one
+        deadline = min(deadline, DEADLINES[priority]) if deadline and deadline > 0 else DEADLINES[priority]
+        ticket = _Ticket(key or "anonymous", priority)
+        with self._lock:
+            if self._waiting() >= self.queue_max:
+                self.counters["rejected_full"] += 1
+                raise Overloaded("queue full", self._estimate(priority))
+            estimate = self._estimate(priority)
+            if estimate > deadline:
+                self.counters["rejected_estimate"] += 1
+                raise Overloaded(f"estimated wait {estimate:.0f}s exceeds deadline {deadline:.0f}s", estimate - deadline)
+            self._queues[priority].setdefault(ticket.key, deque()).append(ticket)
+            self._dispatch()
+
+        if not ticket.granted.wait(deadline):
+            with self._lock:
+                if self._remove(ticket):
+                    self.counters["rejected_deadline"] += 1
+                    raise Overloaded("deadline passed while queued", self._estimate(priority))
+            # granted between the timeout and the lock: run it
+
+        with self._lock:
+            self.counters["admitted"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                took = time.monotonic() - started
+                self._service = (1 - EWMA_ALPHA) * self._service + EWMA_ALPHA * took
+                self._running -= 1
+                self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                "concurrency": self.concurrency,
+                "running": self._running,
+                "queued": {p: self._waiting(p) for p in PRIORITIES},
+                "queue_max": self.queue_max,
+                "service_seconds_ewma": round(self._service, 3),
+                "wait_ms_avg": round(1000 * sum(waits) / len(waits), 1) if waits else 0.0,
+                "wait_ms_p95": round(1000 * waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0,
+                **self.counters,
+            }
+
+
+ADMISSION = AdmissionController()
+
+
+def _metrics():
+    st = ADMISSION.stats()
+    yield from gauge_lines("opal_admission_queued", "Queries waiting for a slot.",
+                           [({"priority": p}, n) for p, n in st["queued"].items()])
+    yield from gauge_lines("opal_admission_running", "Queries holding a slot.", [({}, st["running"])])
+    yield from gauge_lines("opal_admission_total", "Admission decisions.",
+                           [({"result": k}, v) for k, v in ADMISSION.counters.items()], kind="counter")
+
+
+register_collector(_metrics)
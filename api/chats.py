@@ -1,22 +1,31 @@
 # api/chats.py
+import json
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, Header, Query
+import base64
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from typing import Optional, List
-from db.session import SessionLocal
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, undefer
+from typing import Any, Dict, Optional, List, Union
+from db.session import get_async_db
 from db.models import Chat, Message
+from db.snippets import pack, pack_sources, unpack, unpack_sources
+from db import search as fts
 from datetime import datetime
 from api.security import check_key
 
 router = APIRouter(prefix="/chats", tags=["chats"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+PAGE_MAX = 500
+MESSAGES_PAGE = 100                 # ?cursor= without ?limit=
+SEARCH_DEPTH_MAX = 1000             # ranked results: deeper pages re-rank too much
+HEAVY_FIELDS = ("raw", "payload")   # deferred columns, only returned when asked via ?include=
+
+# Handlers are async on an AsyncSession (db.session.get_async_db) so chat traffic
+# stays on the event loop instead of competing for the threadpool with /query.
+# Sync helpers (FTS search, snippet expansion, record_turn) run via run_sync.
+get_db = get_async_db
 
 # --- Schemas
 class ChatOut(BaseModel):
@@ -25,6 +34,7 @@ class ChatOut(BaseModel):
     archived: bool
     created_at: datetime
     updated_at: datetime
+    message_count: int = 0
     class Config:
         from_attributes = True
 
@@ -39,104 +49,285 @@ class MessageIn(BaseModel):
     content: str
     raw: Optional[str] = None
     parsed_response: Optional[str] = None
-    sources: Optional[List[str]] = None
+    sources: Optional[List[Union[str, Dict[str, Any]]]] = None
     payload: Optional[dict] = None
 
 class MessageOut(BaseModel):
     id: int
     role: str
     content: str
-    raw: Optional[str]
+    raw: Optional[str] = None
     parsed_response: Optional[str]
-    sources: Optional[List[str]]
-    payload: Optional[dict]
+    sources: Optional[List[Union[str, Dict[str, Any]]]]   # /query: query_data2.Source dicts
+    payload: Optional[dict] = None
     created_at: datetime
     class Config:
         from_attributes = True
 
+class SearchHit(BaseModel):
+    kind: str                      # "chat" (title hit) | "message"
+    chat_id: str
+    chat_title: str
+    message_id: Optional[int]
+    role: Optional[str]
+    at: datetime
+    rank: float                    # higher = better
+    snippet: str                   # HTML-escaped, matches wrapped in <mark>
+
+# --- Cursors
+# Opaque cursors, sent back in the X-Next-Cursor header (no header = last page):
+# keyset (sort timestamp, id) of the last row for the listings, a rank offset for search.
+def _encode_cursor(*key) -> str:
+    raw = json.dumps([k.isoformat() if isinstance(k, datetime) else k for k in key]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> list:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if isinstance(key, list):
+            return key
+    except Exception:
+        pass
+    raise HTTPException(400, "Invalid cursor")
+
+def _keyset(cursor: str):
+    try:
+        ts, row_id = _decode_cursor(cursor)
+        return datetime.fromisoformat(ts), row_id
+    except (ValueError, TypeError):
+        raise HTTPException(400, "Invalid cursor")
+
+def _page(rows: list, limit: int, response: Response, key) -> list:
+    """Trim the probe row (limit + 1) and set X-Next-Cursor if there is more."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(*key(rows[-1]))
+    return rows
+
+def _include(include: Optional[str]) -> set:
+    fields = {f.strip() for f in (include or "").split(",") if f.strip()}
+    unknown = fields - set(HEAVY_FIELDS)
+    if unknown:
+        raise HTTPException(400, f"Unknown include field(s): {', '.join(sorted(unknown))}")
+    return fields
+
 
 
 @router.get("", response_model=List[ChatOut])
-def list_chats(
+async def list_chats(
+    response: Response,
     x_api_key: Optional[str] = Header(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     q: Optional[str] = Query(None),
     archived: Optional[bool] = Query(False),
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=PAGE_MAX),
+    cursor: Optional[str] = Query(None),
 ):
+    """Most recently updated first; pass X-Next-Cursor back as ?cursor= for the next page."""
     check_key(x_api_key)
-    qry = db.query(Chat).filter(Chat.archived == (archived or False))
+    qry = select(Chat).where(Chat.archived == (archived or False))
     if q:
-        qry = qry.filter(Chat.title.ilike(f"%{q}%"))
-    return qry.order_by(Chat.updated_at.desc()).limit(limit).all()
+        if fts.enabled(db.bind):
+            qry = qry.where(Chat.id.in_(fts.matching_chat_ids(q)))
+        else:
+            qry = qry.where(Chat.title.ilike(f"%{q}%"))
+    if cursor:
+        ts, cid = _keyset(cursor)
+        qry = qry.where(or_(Chat.updated_at < ts, and_(Chat.updated_at == ts, Chat.id < cid)))
+    rows = (await db.scalars(qry.order_by(Chat.updated_at.desc(), Chat.id.desc()).limit(limit + 1))).all()
+    return _page(list(rows), limit, response, lambda c: (c.updated_at, c.id))
+
+@router.get("/search", response_model=List[SearchHit])
+async def search_chats(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    x_api_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    archived: Optional[bool] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+):
+    """Ranked title + message hits with highlighted snippets; X-Next-Cursor for the next page."""
+    check_key(x_api_key)
+    offset = (_decode_cursor(cursor) or [None])[0] if cursor else 0
+    if not isinstance(offset, int) or not 0 <= offset <= SEARCH_DEPTH_MAX:
+        raise HTTPException(400, "Invalid cursor")
+    hits = await db.run_sync(
+        lambda s: fts.search(s.connection(), q, limit=limit + 1, offset=offset, archived=archived)
+    )
+    if len(hits) > limit:
+        hits = hits[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(offset + limit)
+    return hits
+
+async def _get_chat(db: AsyncSession, chat_id: str) -> Chat:
+    chat = await db.get(Chat, chat_id)
+    if not chat: raise HTTPException(404, "Chat not found")
+    return chat
 
 @router.post("", response_model=ChatOut)
-def create_chat(
+async def create_chat(
     body: ChatCreate,
     x_api_key: Optional[str] = Header(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     check_key(x_api_key)
     cid = str(uuid.uuid4())
     title = body.title or "New Chat"
     chat = Chat(id=cid, title=title)
     db.add(chat)
-    db.commit()
-    db.refresh(chat)
+    await db.commit()
     return chat
 
 @router.get("/{chat_id}", response_model=ChatOut)
-def get_chat(chat_id: str, x_api_key: Optional[str] = Header(None), db: Session = Depends(get_db)):
+async def get_chat(chat_id: str, x_api_key: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
     check_key(x_api_key)
-    chat = db.query(Chat).get(chat_id)
-    if not chat: raise HTTPException(404, "Chat not found")
-    return chat
+    return await _get_chat(db, chat_id)
 
 @router.patch("/{chat_id}", response_model=ChatOut)
-def rename_chat(chat_id: str, body: ChatRename, x_api_key: Optional[str] = Header(None), db: Session = Depends(get_db)):
+async def rename_chat(chat_id: str, body: ChatRename, x_api_key: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
     check_key(x_api_key)
-    chat = db.query(Chat).get(chat_id)
-    if not chat: raise HTTPException(404, "Chat not found")
+    chat = await _get_chat(db, chat_id)
     chat.title = body.title
     chat.updated_at = datetime.utcnow()
-    db.commit(); db.refresh(chat)
+    await db.commit()
     return chat
 
 @router.delete("/{chat_id}")
-def delete_chat(chat_id: str, x_api_key: Optional[str] = Header(None), db: Session = Depends(get_db)):
+async def delete_chat(chat_id: str, x_api_key: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
     check_key(x_api_key)
-    chat = db.query(Chat).get(chat_id)
-    if not chat: raise HTTPException(404, "Chat not found")
-    db.delete(chat); db.commit()
+    chat = await _get_chat(db, chat_id)
+    await db.delete(chat); await db.commit()
     return {"ok": True}
 
 @router.post("/{chat_id}/archive")
-def archive_chat(chat_id: str, x_api_key: Optional[str] = Header(None), db: Session = Depends(get_db)):
+async def archive_chat(chat_id: str, x_api_key: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
     check_key(x_api_key)
-    chat = db.query(Chat).get(chat_id)
-    if not chat: raise HTTPException(404, "Chat not found")
+    chat = await _get_chat(db, chat_id)
     chat.archived = True; chat.updated_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
     return {"ok": True}
 
 @router.get("/{chat_id}/messages", response_model=List[MessageOut])
-def list_messages(chat_id: str, x_api_key: Optional[str] = Header(None), db: Session = Depends(get_db)):
+async def list_messages(
+    chat_id: str,
+    response: Response,
+    x_api_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX),
+    cursor: Optional[str] = Query(None),
+    include: Optional[str] = Query(None, description="comma-separated: raw,payload"),
+):
+    """
+    Oldest first; raw/payload are only loaded and returned when listed in ?include=.
+    Without ?limit= and ?cursor= the whole history comes back (as before paging);
+    with either, pages of `limit` (default MESSAGES_PAGE) and X-Next-Cursor.
+    """
     check_key(x_api_key)
-    chat = db.query(Chat).get(chat_id)
-    if not chat: raise HTTPException(404, "Chat not found")
-    msgs = db.query(Message).filter(Message.chat_id == chat_id).order_by(Message.created_at.asc()).all()
-    return msgs
+    fields = _include(include)
+    await _get_chat(db, chat_id)
+    qry = select(Message).where(Message.chat_id == chat_id)
+    if cursor:
+        ts, mid = _keyset(cursor)
+        qry = qry.where(or_(Message.created_at > ts, and_(Message.created_at == ts, Message.id > mid)))
+    qry = qry.options(*(undefer(getattr(Message, f)) for f in fields))
+    qry = qry.order_by(Message.created_at.asc(), Message.id.asc())
+    if limit is None and cursor is None:
+        rows = list((await db.scalars(qry)).all())
+    else:
+        limit = limit or MESSAGES_PAGE
+        rows = (await db.scalars(qry.limit(limit + 1))).all()
+        rows = _page(list(rows), limit, response, lambda m: (m.created_at, m.id))
+    raws = [m.raw if "raw" in fields else None for m in rows]
+    texts = [m.content for m in rows] + raws
+    contents, sources = await db.run_sync(lambda s: (unpack(s, texts), unpack_sources(s, [m.sources for m in rows])))
+    # build the output by hand: reading a deferred column would need a lazy load per row
+    return [
+        MessageOut(
+            id=m.id, role=m.role, content=contents[i], parsed_response=m.parsed_response,
+            sources=sources[i], created_at=m.created_at,
+            raw=contents[len(rows) + i],
+            **({"payload": m.payload} if "payload" in fields else {}),
+        )
+        for i, m in enumerate(rows)
+    ]
 
 @router.post("/{chat_id}/messages", response_model=MessageOut)
-def add_message(chat_id: str, body: MessageIn, x_api_key: Optional[str] = Header(None), db: Session = Depends(get_db)):
+async def add_message(chat_id: str, body: MessageIn, x_api_key: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
     check_key(x_api_key)
-    chat = db.query(Chat).get(chat_id)
-    if not chat: raise HTTPException(404, "Chat not found")
+    now = datetime.utcnow()
+    # write first (takes the SQLite write lock up front), then the row
+    bumped = await db.execute(
+        update(Chat).where(Chat.id == chat_id)
+        .values(updated_at=now, message_count=Chat.message_count + 1)
+    )
+    if not bumped.rowcount: raise HTTPException(404, "Chat not found")
     msg = Message(
         chat_id=chat_id, role=body.role, content=body.content,
         raw=body.raw, parsed_response=body.parsed_response,
-        sources=body.sources, payload=body.payload
+        sources=body.sources, payload=body.payload, created_at=now,
     )
-    chat.updated_at = datetime.utcnow()
-    db.add(msg); db.commit(); db.refresh(msg)
+    db.add(msg); await db.commit()
     return msg
+
+# --- Query turns (used by /query)
+DEFAULT_TITLES = {"new chat", "imported chat"}
+
+def _write_turn(
+    db: Session,
+    chat_id: str,
+    question: str,
+    payload: dict,
+    answer: Optional[str] = None,
+    answer_payload: Optional[dict] = None,
+    sources: Optional[List[Dict[str, Any]]] = None,
+    raw: Optional[str] = None,
+    title: Optional[str] = None,
+    asked_at: Optional[datetime] = None,
+) -> dict:
+    """
+    Write one /query turn (not committed): the question, the answer (if any) with its
+    structured sources (snippet text by reference), `raw` (the CLI text, only when the
+    caller asked for it), chat.updated_at / message_count, and `title` on the chat's
+    first turn if it still has a default name. Returns the chat as ChatOut-shaped dict.
+    The first statement is the write, so the transaction takes the SQLite write lock
+    up front (and waits on busy_timeout) instead of failing on a read->write upgrade.
+    """
+    now = datetime.utcnow()
+    added = 1 if answer is None else 2
+    bumped = db.execute(
+        update(Chat).where(Chat.id == chat_id)
+        .values(updated_at=now, message_count=Chat.message_count + added)
+    ).rowcount
+    if not bumped:
+        db.add(Chat(id=chat_id, title="New chat", created_at=now, updated_at=now, message_count=added))
+        db.flush()
+    chat = db.get(Chat, chat_id)
+
+    db.add(Message(chat_id=chat_id, role="user", content=question, payload=payload, created_at=asked_at or now))
+    if answer is not None:
+        db.add(Message(
+            chat_id=chat_id, role="assistant", content=answer,
+            sources=pack_sources(db, sources) if sources else None,
+            raw=pack(db, raw, ((src.get("chunk_id"), src.get("snippet") or "") for src in sources or ()))
+            if raw is not None else None,
+            payload=answer_payload, created_at=now,
+        ))
+        first_turn = chat.message_count <= added
+        if first_turn and title and (chat.title or "").strip().lower() in DEFAULT_TITLES \
+                and title.strip().lower() not in DEFAULT_TITLES:
+            chat.title = title
+    db.flush()
+    return ChatOut.model_validate(chat).model_dump(mode="json")
+
+def record_turn(db: Session, chat_id: str, question: str, payload: dict, **answer) -> dict:
+    """Store one /query turn in a single short transaction (sync session)."""
+    snapshot = _write_turn(db, chat_id, question, payload, **answer)
+    db.commit()
+    return snapshot
+
+async def arecord_turn(db: AsyncSession, chat_id: str, question: str, payload: dict, **answer) -> dict:
+    """record_turn on an AsyncSession."""
+    snapshot = await db.run_sync(_write_turn, chat_id, question, payload, **answer)
+    await db.commit()
+    return snapshot
@@ -8,19 +8,27 @@ import shutil
 import re
 import html
 from pathlib import Path
+from contextlib import ExitStack
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 
-from fastapi import FastAPI, BackgroundTasks, HTTPException, Header, UploadFile, File, Query
+import anyio
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Header, Request, UploadFile, File, Query
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
+from starlette.concurrency import iterate_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
 from db.init_db import init_db
-from db.session import SessionLocal
-from db.models import Chat, Message
-from api.chats import router as chats_router
+from db.session import async_session_factory
+from api.chats import router as chats_router, arecord_turn
 from api.security import check_key
-from vectordb.chroma_client import get_chroma
+from api.warmup import WARMUP_STATE, start_warmup
+from api.admission import ADMISSION, Overloaded, client_key
+from vectordb.snapshots import current_index_dir, manifest_path
+from telemetry.metrics import INGEST_METRICS_FILE, STAGE_SECONDS, render as render_metrics
+# vectordb.chroma_client (langchain/chromadb) is imported lazily: warm-up opens it in the background
 
 # --- Python executable to use for subprocesses (works in Docker, Linux, Mac, Windows)
 PYTHON_BIN = os.getenv("PYTHON_BIN", sys.executable or "python")
@@ -29,7 +37,7 @@ PYTHON_BIN = os.getenv("PYTHON_BIN", sys.executable or "python")
 API_KEY = os.getenv("OPAL_API_KEY", "my-secret-key")
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 DATA_DIR = (PROJECT_ROOT / "data").resolve()
-MANIFEST_PATH = (PROJECT_ROOT / "chroma/.ingest_manifest.json").resolve()
+CHROMA_DIR = (PROJECT_ROOT / "chroma").resolve()
 DATA_PATH = DATA_DIR
 
 # CORS origins (dev Vite/Svelte)
@@ -50,11 +58,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After"],
 )
 
 @app.on_event("startup")
 def _startup():
     init_db()
+    start_warmup(CHROMA_DIR)  # background thread; the server starts accepting connections right away
 
 # mount chats routes
 app.include_router(chats_router)
@@ -67,16 +77,19 @@ def _safe_in_data(p: Path) -> Path:
     return rp
 
 def _load_manifest() -> dict:
-    if MANIFEST_PATH.exists():
+    # Manifest lives inside the active snapshot; resolve per call to follow swaps.
+    path = manifest_path(CHROMA_DIR)
+    if path.exists():
         try:
-            return json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+            return json.loads(path.read_text(encoding="utf-8"))
         except Exception:
             return {}
     return {}
 
 def _save_manifest(m: dict) -> None:
-    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
-    MANIFEST_PATH.write_text(json.dumps(m, ensure_ascii=False, indent=2), encoding="utf-8")
+    path = manifest_path(CHROMA_DIR)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(m, ensure_ascii=False, indent=2), encoding="utf-8")
 
 # light ingest "job" status
 INGEST_STATE: Dict[str, Any] = {"last_started": None, "last_finished": None, "args": None, "running": False}
@@ -109,22 +122,36 @@ class QueryRequest(BaseModel):
     model: str = "mistral"
     show_snippets: bool = True
     chat_id: Optional[str] = None
+    include_stdout: bool = False   # also return the CLI text (old clients)
 
 # -------- Routes --------
 @app.get("/health")
 def health(x_api_key: Optional[str] = Header(None)):
+    """Liveness: the process is up. `ready` tells whether warm-up is done."""
     check_key(x_api_key)
-    return {"ok": True}
+    from embeddings.ollama_pool import get_pool
+    return {"ok": True, "ready": WARMUP_STATE["ready"], "warmup": WARMUP_STATE, "ollama": get_pool().stats(), "admission": ADMISSION.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics(x_api_key: Optional[str] = Header(None)):
+    """Prometheus text format: stage latencies, cache hits, Ollama/admission queues,
+    and the last ingest run. Per worker process when running several workers."""
+    check_key(x_api_key)
+    import embeddings.ollama_pool  # noqa: F401  (registers its collector)
+    return PlainTextResponse(render_metrics([PROJECT_ROOT / INGEST_METRICS_FILE]),
+                             media_type="text/plain; version=0.0.4")
+
+@app.get("/health/ready")
+def health_ready(x_api_key: Optional[str] = Header(None)):
+    """Readiness: 503 until the vector store is open and models were warmed."""
+    check_key(x_api_key)
+    status = 200 if WARMUP_STATE["ready"] else 503
+    return JSONResponse({"ready": WARMUP_STATE["ready"], "warmup": WARMUP_STATE}, status_code=status)
 
 @app.get("/files")
 def files(x_api_key: Optional[str] = Header(None)):
     check_key(x_api_key)
-    if not MANIFEST_PATH.exists():
-        return {"files": []}
-    try:
-        data = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
-    except Exception:
-        data = {}
+    data = _load_manifest()
     items = [{"path": k, "sig": v.get("sig")} for k, v in data.items()]
     return {"files": items}
 
@@ -139,124 +166,184 @@ def ingest(req: IngestRequest, background_tasks: BackgroundTasks, x_api_key: Opt
 
 
 from fastapi import Depends
-QUERY_SCRIPT = os.getenv("QUERY_SCRIPT", "query_data2.py")
+QUERY_SCRIPT = "query_data2.py"  # only echoed in `args`; queries run in-process
 
 @app.post("/query")
-def query(req: QueryRequest, x_api_key: Optional[str] = Header(None)):
+def query(
+    req: QueryRequest,
+    request: Request,
+    x_api_key: Optional[str] = Header(None),
+    x_priority: Optional[str] = Header(None),   # "batch" lowers a chat turn; can't raise
+    x_deadline: Optional[float] = Header(None), # max seconds to wait for a slot (capped)
+    x_client_id: Optional[str] = Header(None),  # fairness key, only from TRUSTED_PROXIES
+):
     check_key(x_api_key)
 
     args = [PYTHON_BIN, QUERY_SCRIPT, req.query, "--k", str(req.k), "--model", req.model]
-    env = {**os.environ, "PYTHONIOENCODING": "utf-8"}
 
     chat_id = req.chat_id
 
-    # record USER message first
-    if chat_id:
-        db = SessionLocal()
-        try:
-            chat = db.get(Chat, chat_id)
-            if not chat:
-                chat = Chat(id=chat_id, title="New chat")
-                db.add(chat)
-                db.commit()
-                db.refresh(chat)
-
-            try:
-                payload_dict = req.model_dump()
-            except AttributeError:
-                payload_dict = req.dict()
-
-            db.add(Message(
-                chat_id=chat.id,
-                role="user",
-                content=req.query,
-                payload=payload_dict
-            ))
-            chat.updated_at = datetime.utcnow()
-            db.commit()
-        finally:
-            db.close()
-
-    # run model subprocess
+    # admission control: answer 429 early rather than queue into a timeout
+    priority = "interactive" if chat_id and x_priority != "batch" else "batch"
+    client = client_key(x_client_id, request.client.host if request.client else None)
+    slot = ExitStack()
     try:
-        proc = subprocess.run(
-            args,
-            cwd=str(PROJECT_ROOT),
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-            env=env,
-            timeout=60,
-        )
-    except subprocess.TimeoutExpired as te:
+        slot.enter_context(ADMISSION.admit(client, priority, x_deadline))
+    except Overloaded as e:
         raise HTTPException(
-            status_code=504,
-            detail=(
-                f"Query timed out after 60s.\nArgs: {args}\n"
-                f"Partial stdout:\n{te.stdout or ''}\nPartial stderr:\n{te.stderr or ''}\n"
-                f"Tip: ensure Ollama is reachable and the model '{req.model}' is available."
-            ),
+            status_code=429,
+            detail=f"Server busy ({e.reason}); retry in {e.retry_after}s.",
+            headers={"Retry-After": str(e.retry_after)},
         )
-    except Exception as e:
-        raise HTTPException(500, f"Query subprocess failed to start: {e}")
 
-    if proc.returncode != 0:
-        raise HTTPException(
-            500,
-            f"Query failed.\nArgs: {args}\nStderr:\n{proc.stderr}\n"
-            f"Tip: ensure Ollama is reachable and 'ollama pull {req.model}'.",
-        )
+    try:
+        payload_dict = req.model_dump()
+    except AttributeError:
+        payload_dict = req.dict()
+    asked_at = datetime.utcnow()
+
+    async def _arecord(answer: dict) -> dict:
+        async with async_session_factory()() as db:
+            return await arecord_turn(db, chat_id, req.query, payload_dict, asked_at=asked_at, **answer)
+
+    record_error: Dict[str, str] = {}
+
+    def _record(**answer) -> Optional[dict]:
+        # one short write transaction per query (question + answer + chat counters),
+        # run on the event loop through the async engine like the chats router.
+        # A failed write is logged and reported, never replaces the query's own result/error.
+        if not chat_id:
+            return None
+        try:
+            return anyio.from_thread.run(_arecord, answer)
+        except Exception as e:
+            print(f"⚠️ Could not record query turn in chat {chat_id}: {type(e).__name__}: {e}")
+            record_error["chat_error"] = f"{type(e).__name__}: {e}"
+            return None
 
-    # persist ASSISTANT message and auto-name on first turn
-    chat_snapshot = None
-    if chat_id:
-        db = SessionLocal()
+    try:
+        # run the query engine in-process (shared Chroma handle + Ollama pool)
         try:
-            chat = db.get(Chat, chat_id)
-            if chat:
-                db.add(Message(
-                    chat_id=chat.id,
-                    role="assistant",
-                    content=proc.stdout,
-                    raw=proc.stdout,
-                    payload={"args": args, "code": proc.returncode},
-                ))
-                chat.updated_at = datetime.utcnow()
-                db.commit()
-
-                try:
-                    default_names = {"new chat", "imported chat"}
-                    is_default = (chat.title or "").strip().lower() in default_names
-                    msg_count = db.query(Message).filter(Message.chat_id == chat.id).count()
-                    if is_default and msg_count <= 2:
-                        final_answer = _extract_final_answer(proc.stdout)
-                        new_title = _derive_title(req.query, final_answer)
-                        if new_title and new_title.strip().lower() not in default_names:
-                            chat.title = new_title
-                            chat.updated_at = datetime.utcnow()
-                            db.commit()
-                except Exception:
-                    pass
-
-                chat_snapshot = {
-                    "id": chat.id,
-                    "title": chat.title,
-                    "archived": chat.archived,
-                    "created_at": chat.created_at.isoformat(),
-                    "updated_at": chat.updated_at.isoformat(),
-                }
-        finally:
-            db.close()
+            import httpx
+            from query_data2 import answer_query
+            from vectordb.chroma_client import get_shared_chroma
+            result = answer_query(
+                req.query, k=req.k, model=req.model, file=req.file or "", typ=req.type or "",
+                db=get_shared_chroma(str(CHROMA_DIR)),
+            )
+        except (httpx.TimeoutException, TimeoutError) as te:
+            _record()
+            raise HTTPException(
+                status_code=504,
+                detail=(
+                    f"Query timed out.\nArgs: {args}\n{type(te).__name__}: {te}\n"
+                    f"Tip: ensure Ollama is reachable and the model '{req.model}' is available."
+                ),
+            )
+        except Exception as e:
+            _record()
+            raise HTTPException(
+                500,
+                f"Query failed.\nArgs: {args}\nError: {type(e).__name__}: {e}\n"
+                f"Tip: ensure Ollama is reachable and 'ollama pull {req.model}'.",
+            )
+    finally:
+        slot.close()
+
+    out = result.to_dict()
+
+    # persist question + ASSISTANT message and auto-name on first turn
+    t0 = time.perf_counter()
+    chat_snapshot = _record(
+        answer=result.answer,
+        answer_payload={"args": args, "code": 0, "timings": result.timings, "error": result.error},
+        sources=out["sources"],  # snippet text stored once, by reference
+        raw=result.stdout if req.include_stdout else None,
+        title=_derive_title(req.query, result.answer),
+    )
+    if chat_snapshot is not None:
+        db_write = time.perf_counter() - t0
+        STAGE_SECONDS.observe(db_write, pipeline="query", stage="db_write")
+        out["timings"]["db_write"] = round(1000 * db_write, 1)
 
     return {
         "args": args,
-        "code": proc.returncode,
-        "stdout": proc.stdout,
-        "stderr": proc.stderr,
+        "code": 0,
+        **out,
+        **({"stdout": result.stdout} if req.include_stdout else {}),
         "chat": chat_snapshot,
+        **record_error,
     }
 
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "500"))
+
+@app.post("/query/batch")
+def query_batch(
+    reqs: List[QueryRequest],
+    request: Request,
+    x_api_key: Optional[str] = Header(None),
+    x_deadline: Optional[float] = Header(None),
+    x_client_id: Optional[str] = Header(None),
+):
+    """
+    Answer many queries in one call (evaluation/reporting jobs). Questions are
+    embedded in one batched call, searched together and generated through the
+    shared Ollama limit. Streams one NDJSON line per query as it completes
+    (`index` = position in the request). Chat history is not recorded.
+    """
+    check_key(x_api_key)
+    if not reqs:
+        raise HTTPException(400, "Empty batch")
+    if len(reqs) > QUERY_BATCH_MAX:
+        raise HTTPException(413, f"Batch too large ({len(reqs)} > {QUERY_BATCH_MAX})")
+
+    # the whole batch holds one "batch" slot; its generations share the pool limit
+    slot = ExitStack()
+    try:
+        client = client_key(x_client_id, request.client.host if request.client else None)
+        slot.enter_context(ADMISSION.admit(client, "batch", x_deadline))
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Server busy ({e.reason}); retry in {e.retry_after}s.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    items = [{"query": r.query, "k": r.k, "model": r.model, "file": r.file, "type": r.type} for r in reqs]
+
+    def stream():
+        try:
+            from query_data2 import answer_queries
+            from vectordb.chroma_client import get_shared_chroma
+            for i, res in answer_queries(items, db=get_shared_chroma(str(CHROMA_DIR))):
+                yield json.dumps({
+                    "index": i,
+                    "query": items[i]["query"],
+                    **res.to_dict(),
+                    **({"stdout": res.stdout} if reqs[i].include_stdout else {}),
+                }, ensure_ascii=False) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": f"{type(e).__name__}: {e}"}) + "\n"
+        finally:
+            slot.close()
+
+    try:
+        # the slot is released when the response is done, also if it was never iterated
+        return StreamingResponse(_closing(stream()), media_type="application/x-ndjson",
+                                 background=BackgroundTask(slot.close))
+    except BaseException:
+        slot.close()
+        raise
+
+async def _closing(gen):
+    """Iterate a sync generator in the threadpool and close it when the client goes
+    away: Starlette just stops iterating, which would leave its `finally` to the GC."""
+    try:
+        async for chunk in iterate_in_threadpool(gen):
+            yield chunk
+    finally:
+        gen.close()
+
 @app.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
@@ -277,6 +364,7 @@ def ingest_status(x_api_key: Optional[str] = Header(None)):
         "last_started": INGEST_STATE.get("last_started"),
         "last_finished": INGEST_STATE.get("last_finished"),
         "args": INGEST_STATE.get("args"),
+        "snapshot": current_index_dir(CHROMA_DIR).name,
     }
 
 @app.delete("/files")
@@ -300,7 +388,8 @@ def delete_file(
         shutil.rmtree(abs_path)
 
     try:
-        db = get_chroma()
+        from vectordb.chroma_client import get_shared_chroma
+        db = get_shared_chroma(str(CHROMA_DIR))
         db._collection.delete(where={"source": {"$eq": str(abs_path.resolve())}})
     except Exception as e:
         print("Vector delete error:", e)
@@ -321,7 +410,8 @@ def delete_file(
 def files_index_status(x_api_key: Optional[str] = Header(None)):
     check_key(x_api_key)
     try:
-        db = get_chroma()
+        from vectordb.chroma_client import get_shared_chroma
+        db = get_shared_chroma(str(CHROMA_DIR))
         res = db._collection.get(include=["metadatas", "ids"])
         counts_by_doc: Dict[str, int] = {}
         counts_by_source: Dict[str, int] = {}
@@ -339,20 +429,6 @@ def files_index_status(x_api_key: Optional[str] = Header(None)):
         return {"by_doc_name": {}, "by_source": {}}
 
 # --- Helpers for chat auto-naming -------------------------------------------
-RESP_RE = re.compile(r"Response:\s*([\s\S]*?)(?:\n+Sources:|$)", re.IGNORECASE)
-
-def _extract_final_answer(stdout: str) -> str:
-    if not stdout:
-        return ""
-    m = RESP_RE.search(stdout)
-    if m:
-        return m.group(1).strip()
-    for line in reversed(stdout.splitlines()):
-        line = line.strip()
-        if line:
-            return line
-    return ""
-
 def _strip_html(s: str) -> str:
     return html.unescape(re.sub(r"<[^>]+>", "", s)).strip()
 
@@ -0,0 +1,87 @@
+# api/warmup.py
+"""
+Background warm-up after the API starts accepting connections.
+
+Steps (each timed in WARMUP_STATE, failures recorded but not fatal):
+  vector_store   open the active Chroma snapshot once (shared handle)
+  index_pages    read the snapshot files so HNSW/SQLite pages are in the OS cache
+  embed          one embedding via the shared Ollama pool (keep_alive holds the model)
+  chat:<model>   empty-prompt generate per OLLAMA_WARM_MODELS (loads the model, 0 tokens)
+
+The API is *ready* once warm-up finished and the vector store opened; liveness
+does not depend on it.
+"""
+import os
+import time
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+WARM_MODELS = [m.strip() for m in os.getenv("OLLAMA_WARM_MODELS", "mistral").split(",") if m.strip()]
+TOUCH_BLOCK = 1024 * 1024
+
+WARMUP_STATE: Dict[str, Any] = {"ready": False, "started": None, "finished": None, "steps": {}}
+_started = threading.Lock()
+
+
+def _step(name: str, fn: Callable[[], Any]) -> bool:
+    t0 = time.perf_counter()
+    try:
+        detail = fn()
+        WARMUP_STATE["steps"][name] = {"ok": True, "seconds": round(time.perf_counter() - t0, 3), "detail": detail}
+        return True
+    except Exception as e:
+        WARMUP_STATE["steps"][name] = {"ok": False, "seconds": round(time.perf_counter() - t0, 3), "error": f"{type(e).__name__}: {e}"}
+        print(f"⚠️ Warm-up step {name} failed: {e}")
+        return False
+
+
+def _open_store(chroma_dir: Path):
+    from vectordb.chroma_client import get_shared_chroma
+    return {"chunks": get_shared_chroma(str(chroma_dir))._collection.count()}
+
+
+def _touch_index(chroma_dir: Path):
+    from vectordb.snapshots import current_index_dir
+    total = 0
+    for p in current_index_dir(chroma_dir).rglob("*"):
+        if p.is_file():
+            with open(p, "rb") as f:
+                while f.read(TOUCH_BLOCK):
+                    pass
+            total += p.stat().st_size
+    return {"mb": round(total / 1e6, 1)}
+
+
+def _warm_embed():
+    from embeddings.ollama_pool import get_pool
+    dim = len(get_pool().embed(EMBED_MODEL, ["warm-up"])[0])
+    return {"model": EMBED_MODEL, "dim": dim}
+
+
+def _warm_chat(model: str):
+    from embeddings.ollama_pool import get_pool
+    # An empty prompt only loads the model; nothing is generated.
+    get_pool().generate(model, "")
+    return {"model": model}
+
+
+def run_warmup(chroma_dir: Path) -> None:
+    WARMUP_STATE["started"] = time.time()
+    store_ok = _step("vector_store", lambda: _open_store(chroma_dir))
+    _step("index_pages", lambda: _touch_index(chroma_dir))
+    _step("embed", _warm_embed)
+    for model in WARM_MODELS:
+        _step(f"chat:{model}", lambda m=model: _warm_chat(m))
+    WARMUP_STATE["finished"] = time.time()
+    WARMUP_STATE["ready"] = store_ok
+    took = WARMUP_STATE["finished"] - WARMUP_STATE["started"]
+    print(f"{'✅' if store_ok else '⚠️'} Warm-up finished in {took:.1f}s (ready={store_ok})")
+
+
+def start_warmup(chroma_dir: Path) -> None:
+    """Run warm-up once on a daemon thread; returns immediately."""
+    if not _started.acquire(blocking=False):
+        return
+    threading.Thread(target=run_warmup, args=(chroma_dir,), name="warmup", daemon=True).start()
@@ -0,0 +1,161 @@
+# bench/bench_chat_db.py — concurrent /query chat writes against SQLite
+#
+#   py bench/bench_chat_db.py [--workers 4] [--threads 8] [--turns 50]
+#
+# Simulates `workers` uvicorn processes with `threads` request threads each, all
+# recording query turns into one fresh database, for two setups:
+#   before  default engine (rollback journal) + the old write pattern:
+#           two sessions, up to four commits and a count() per turn
+#   after   tuned engine (WAL, pragmas, pool) + api.chats.record_turn (one transaction)
+# Reports turns/s, write latency p50/p95/max and "database is locked" errors.
+import os
+import sys
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import statistics
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "bench_chat_unused.db"))
+
+ANSWER = "---- Retrieved chunks ----\n" + "".join(
+    f"[{i}] doc{i}.pdf -> " + "lorem ipsum dolor sit amet " * 12 + "\n" for i in range(1, 6)
+) + "--------------------------\nResponse: The answer is forty-two.\n"
+SOURCES = [
+    {"rank": i, "chunk_id": f"doc{i}.pdf:{i}:abc{i}", "doc_name": f"doc{i}.pdf", "source": f"data/doc{i}.pdf",
+     "type": "pdf", "locator": {"page": i}, "distance": 0.1 * i, "snippet": "lorem ipsum dolor sit amet " * 12}
+    for i in range(1, 6)
+]
+
+
+def _legacy_turn(Session, chat_id: str, question: str):
+    from db.models import Chat, Message
+    db = Session()
+    try:
+        chat = db.get(Chat, chat_id)
+        if not chat:
+            chat = Chat(id=chat_id, title="New chat")
+            db.add(chat); db.commit(); db.refresh(chat)
+        db.add(Message(chat_id=chat.id, role="user", content=question, payload={"query": question}))
+        chat.updated_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+    db = Session()
+    try:
+        chat = db.get(Chat, chat_id)
+        db.add(Message(chat_id=chat.id, role="assistant", content=ANSWER, raw=ANSWER, payload={"code": 0}))
+        chat.updated_at = datetime.utcnow()
+        db.commit()
+        if (chat.title or "").lower() == "new chat" and \
+                db.query(Message).filter(Message.chat_id == chat.id).count() <= 2:
+            chat.title = question[:60]
+            db.commit()
+    finally:
+        db.close()
+
+
+def _new_turn(Session, chat_id: str, question: str):
+    from api.chats import record_turn
+    db = Session()
+    try:
+        record_turn(db, chat_id, question, {"query": question}, answer="The answer is forty-two.",
+                    answer_payload={"code": 0}, sources=SOURCES, title=question[:60])
+    finally:
+        db.close()
+
+
+def _worker(mode: str, url: str, threads: int, turns: int, chats: list, out):
+    from sqlalchemy.orm import sessionmaker
+    from db.session import make_engine
+    import db.search  # noqa: F401  (FTS sync events, as in the API)
+    import api.chats  # noqa: F401  (imported before timing)
+    engine = make_engine(url, tuned=(mode == "after"))
+    Session = sessionmaker(bind=engine, autoflush=False)
+    turn = _new_turn if mode == "after" else _legacy_turn
+    rnd = random.Random(os.getpid())
+
+    def run(_):
+        lat, errors = [], 0
+        for i in range(turns):
+            t0 = time.perf_counter()
+            try:
+                turn(Session, rnd.choice(chats), f"question {i} about topic {rnd.randint(0, 999)}")
+            except Exception as e:
+                errors += 1
+                if "locked" not in str(e):
+                    raise
+            lat.append(time.perf_counter() - t0)
+        return lat, errors
+
+    try:
+        with ThreadPoolExecutor(threads) as ex:
+            results = list(ex.map(run, range(threads)))
+        out.put(([x for lat, _ in results for x in lat], sum(e for _, e in results)))
+    except Exception as e:  # never leave the parent waiting on the queue
+        out.put(e)
+
+
+def bench(mode: str, workers: int, threads: int, turns: int) -> dict:
+    from sqlalchemy.orm import sessionmaker
+    from db.models import Base, Chat
+    from db.session import make_engine
+    from db import search
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_chat_"), "chat.db")
+    url = f"sqlite:///{path}"
+    engine = make_engine(url, tuned=(mode == "after"))
+    Base.metadata.create_all(engine)
+    search.create_index(engine)
+    # chats exist up front (the UI creates them via POST /chats)
+    chats = [str(uuid.uuid4()) for _ in range(workers * threads * 2)]
+    with sessionmaker(bind=engine)() as db:
+        db.add_all(Chat(id=c, title="New chat") for c in chats)
+        db.commit()
+    engine.dispose()
+
+    out = mp.Queue()
+    t0 = time.perf_counter()
+    procs = [mp.Process(target=_worker, args=(mode, url, threads, turns, chats, out)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    lat, errors = [], 0
+    for _ in procs:
+        res = out.get()
+        if isinstance(res, Exception):
+            raise res
+        lat += res[0]; errors += res[1]
+    for p in procs:
+        p.join()
+    wall = time.perf_counter() - t0
+    lat.sort()
+    return {
+        "turns": len(lat), "turns_s": len(lat) / wall, "errors": errors,
+        "p50_ms": 1000 * statistics.median(lat), "p95_ms": 1000 * lat[int(0.95 * (len(lat) - 1))],
+        "max_ms": 1000 * lat[-1],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=4, help="processes (uvicorn workers)")
+    ap.add_argument("--threads", type=int, default=8, help="request threads per worker")
+    ap.add_argument("--turns", type=int, default=50, help="query turns per thread")
+    ap.add_argument("--mode", choices=["before", "after", "both"], default="both")
+    args = ap.parse_args()
+
+    modes = ["before", "after"] if args.mode == "both" else [args.mode]
+    print(f"{args.workers} workers x {args.threads} threads x {args.turns} turns", flush=True)
+    for mode in modes:
+        r = bench(mode, args.workers, args.threads, args.turns)
+        print(f"{mode:<7} {r['turns_s']:8.1f} turns/s  p50 {r['p50_ms']:7.1f} ms  p95 {r['p95_ms']:7.1f} ms  "
+              f"max {r['max_ms']:7.0f} ms  locked errors {r['errors']}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
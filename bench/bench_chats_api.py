@@ -0,0 +1,166 @@
+# bench/bench_chats_api.py — async vs sync chat endpoints under concurrent load
+#
+#   py bench/bench_chats_api.py [--clients 64] [--seconds 10] [--busy 40] [--busy-seconds 1.0]
+#
+# Starts uvicorn with the real (async) chats router plus sync copies of the old
+# list/append handlers under /sync, on a fresh database with --chats chats. Then:
+#   --busy clients keep calling a sync endpoint that blocks --busy-seconds
+#          (stands in for /query holding threadpool threads)
+#   --clients clients alternate GET /chats?limit=50 and POST /chats/{id}/messages
+# for each of "sync" and "async" and reports requests/s and latency p50/p95.
+import os
+import sys
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+# --- server side ---
+
+def build_app():
+    from fastapi import Depends, FastAPI, Header, HTTPException
+    from db.session import SessionLocal
+    from db.models import Chat, Message
+    from api.chats import router, ChatOut, MessageIn, MessageOut
+
+    app = FastAPI()
+    app.include_router(router)
+
+    def get_sync_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    # the handlers as they were before the async conversion
+    @app.get("/sync/chats", response_model=List[ChatOut])
+    def sync_list_chats(db=Depends(get_sync_db), limit: int = 100, x_api_key: Optional[str] = Header(None)):
+        return db.query(Chat).filter(Chat.archived == False).order_by(Chat.updated_at.desc()).limit(limit).all()  # noqa: E712
+
+    @app.post("/sync/chats/{chat_id}/messages", response_model=MessageOut)
+    def sync_add_message(chat_id: str, body: MessageIn, db=Depends(get_sync_db)):
+        chat = db.get(Chat, chat_id)
+        if not chat:
+            raise HTTPException(404, "Chat not found")
+        msg = Message(chat_id=chat_id, role=body.role, content=body.content)
+        chat.updated_at = datetime.utcnow()
+        chat.message_count = Chat.message_count + 1
+        db.add(msg); db.commit(); db.refresh(msg)
+        return msg
+
+    @app.get("/busy")
+    def busy(seconds: float = 1.0):
+        time.sleep(seconds)
+        return {"ok": True}
+
+    return app
+
+
+def serve(port: int):
+    import uvicorn
+    uvicorn.run(build_app(), host="127.0.0.1", port=port, log_level="warning")
+
+
+def seed(n_chats: int) -> List[str]:
+    from db.init_db import init_db
+    from db.session import SessionLocal
+    from db.models import Chat
+    init_db()
+    ids = [str(uuid.uuid4()) for _ in range(n_chats)]
+    with SessionLocal() as db:
+        db.add_all(Chat(id=i, title=f"chat {n}") for n, i in enumerate(ids))
+        db.commit()
+    return ids
+
+
+# --- client side ---
+
+async def run_load(base: str, prefix: str, chat_ids: List[str], clients: int, seconds: float,
+                   busy: int, busy_seconds: float) -> dict:
+    import httpx
+    limits = httpx.Limits(max_connections=clients + busy + 4)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=120) as http:
+        stop = time.perf_counter() + seconds
+        lat: List[float] = []
+        errors = 0
+
+        async def busy_loop():
+            while time.perf_counter() < stop:
+                await http.get("/busy", params={"seconds": busy_seconds})
+
+        async def client(n: int):
+            nonlocal errors
+            rnd = random.Random(n)
+            i = 0
+            while time.perf_counter() < stop:
+                t0 = time.perf_counter()
+                if i % 2:
+                    r = await http.post(f"{prefix}/chats/{rnd.choice(chat_ids)}/messages",
+                                        json={"role": "user", "content": f"message {n}-{i}"})
+                else:
+                    r = await http.get(f"{prefix}/chats", params={"limit": 50})
+                lat.append(time.perf_counter() - t0)
+                errors += r.status_code != 200
+                i += 1
+
+        busy_tasks = [asyncio.create_task(busy_loop()) for _ in range(busy)]
+        await asyncio.sleep(0.2 if busy else 0)  # let the blocking calls occupy the threadpool
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client(n) for n in range(clients)))
+        wall = time.perf_counter() - t0
+        await asyncio.gather(*busy_tasks)
+    lat.sort()
+    return {"requests": len(lat), "rps": len(lat) / wall, "errors": errors,
+            "p50_ms": 1000 * statistics.median(lat), "p95_ms": 1000 * lat[int(0.95 * (len(lat) - 1))]}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=64)
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--busy", type=int, default=40, help="concurrent blocking calls (default = threadpool size)")
+    ap.add_argument("--busy-seconds", type=float, default=1.0)
+    ap.add_argument("--chats", type=int, default=500)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.serve:
+        return serve(args.port)
+
+    db_path = Path(tempfile.mkdtemp(prefix="bench_chats_")) / "chat.db"
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}", "OPAL_API_KEY": ""}
+    os.environ.update(env)
+    chat_ids = seed(args.chats)
+    server = subprocess.Popen([sys.executable, __file__, "--serve", "--port", str(args.port)], cwd=ROOT, env=env)
+    try:
+        base = f"http://127.0.0.1:{args.port}"
+        import httpx
+        for _ in range(100):
+            try:
+                httpx.get(base + "/chats?limit=1", timeout=1); break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        print(f"{args.clients} clients, {args.busy} blocking calls of {args.busy_seconds}s, {args.seconds}s per run", flush=True)
+        for name, prefix in (("sync", "/sync"), ("async", "")):
+            r = asyncio.run(run_load(base, prefix, chat_ids, args.clients, args.seconds, args.busy, args.busy_seconds))
+            print(f"{name:<6} {r['rps']:8.1f} req/s  p50 {r['p50_ms']:7.1f} ms  p95 {r['p95_ms']:7.1f} ms  "
+                  f"({r['requests']} requests, {r['errors']} errors)", flush=True)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
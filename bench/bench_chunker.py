@@ -0,0 +1,77 @@
+# bench/bench_chunker.py — native chunker vs LangChain RecursiveCharacterTextSplitter
+#
+#   py bench/bench_chunker.py [--data data] [--cache cache/extracted] [--repeat 3]
+#
+# Uses cached loader output (see ingest_utils/extract_cache.py) when present so PDFs,
+# DOCX etc. are benchmarked with their real extracted text; otherwise plain-text files.
+import sys
+import gzip
+import json
+import time
+import argparse
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from chunking.text_chunker import chunk_text
+
+TEXT_EXTS = {".txt", ".md", ".json", ".csv", ".log"}
+
+
+def load_corpus(data: Path, cache: Path) -> list[Document]:
+    docs: list[Document] = []
+    for p in cache.rglob("*.json.gz"):
+        with gzip.open(p, "rt", encoding="utf-8") as f:
+            docs += [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in json.load(f)["docs"]]
+    if docs:
+        return docs
+    for p in data.rglob("*"):
+        if p.is_file() and p.suffix.lower() in TEXT_EXTS:
+            docs.append(Document(page_content=p.read_text(encoding="utf-8", errors="replace"),
+                                 metadata={"source": str(p), "doc_name": p.name}))
+    return docs
+
+
+def measure(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, best, peak
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", default="data")
+    ap.add_argument("--cache", default="cache/extracted")
+    ap.add_argument("--chunk-size", type=int, default=800)
+    ap.add_argument("--overlap", type=int, default=80)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    docs = load_corpus(Path(args.data), Path(args.cache))
+    chars = sum(len(d.page_content) for d in docs)
+    print(f"Corpus: {len(docs)} docs, {chars / 1e6:.2f} M chars")
+
+    lc = RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.overlap,
+                                        length_function=len, is_separator_regex=False)
+    runs = {
+        "langchain": lambda: lc.split_documents(docs),
+        "native": lambda: chunk_text(docs, args.chunk_size, args.overlap),
+    }
+    for name, fn in runs.items():
+        chunks, secs, peak = measure(fn, args.repeat)
+        print(f"{name:10s} {len(chunks):7d} chunks  {secs * 1000:8.1f} ms  "
+              f"{chars / 1e6 / secs:6.1f} M chars/s  peak {peak / 1e6:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
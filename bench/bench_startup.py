@@ -0,0 +1,58 @@
+# bench/bench_startup.py — import time and base RSS of the entry points
+#
+#   py bench/bench_startup.py [--repeat 5] [module ...]
+#
+# Each run imports the module in a fresh interpreter and reports wall time,
+# peak RSS and which heavy optional dependencies ended up in sys.modules.
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_MODULES = ["ingest", "ingest_utils.loaders_map", "api.main"]
+HEAVY = ["faster_whisper", "ctranslate2", "PIL", "pytesseract", "pandas", "openpyxl",
+         "unstructured", "docx2txt", "chromadb", "langchain_chroma", "langchain_ollama", "tiktoken"]
+
+PROBE = """
+import sys, time, json, resource
+t0 = time.perf_counter()
+import {module}
+dt = time.perf_counter() - t0
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB -> MiB (Linux)
+print(json.dumps({{"seconds": dt, "rss_mb": rss, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe(module: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else f"exit {out.returncode}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    for module in args.modules:
+        try:
+            runs = [probe(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{module:28s} import failed: {e}")
+            continue
+        secs = statistics.median(r["seconds"] for r in runs)
+        rss = statistics.median(r["rss_mb"] for r in runs)
+        heavy = ", ".join(runs[-1]["heavy"]) or "-"
+        print(f"{module:28s} {secs * 1000:8.0f} ms  {rss:7.1f} MiB  heavy: {heavy}")
+
+
+if __name__ == "__main__":
+    main()
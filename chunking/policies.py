@@ -0,0 +1,142 @@
+"""
+Per-type chunking policies (config.yaml -> chunking.types.<type>).
+
+Loaders emit very different units: Unstructured elements (docx/md/pptx), one
+row per Document (excel/csv), whisper segments (video). A policy first groups
+those units into denser documents, then splits them with its own size/overlap;
+keys a type doesn't set fall back to chunking.text.
+
+Strategies:
+    merge_elements  consecutive elements of a source until chunk_size
+    rows            rows_per_chunk consecutive rows of the same sheet
+    time_window     transcript segments within window_seconds
+    (none)          split loader output as-is
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from langchain_core.documents import Document
+
+from chunking.text_chunker import iter_chunks, token_length_function
+
+
+def _runs(docs: Iterable[Document], *keys: str) -> Iterator[List[Document]]:
+    """Consecutive docs sharing source (+ extra metadata keys)."""
+    run: List[Document] = []
+    current = None
+    for d in docs:
+        md = d.metadata or {}
+        k = (md.get("source"),) + tuple(md.get(x) for x in keys)
+        if run and k != current:
+            yield run
+            run = []
+        current = k
+        run.append(d)
+    if run:
+        yield run
+
+
+def merge_elements(docs: Iterable[Document], chunk_size: int) -> Iterator[Document]:
+    for run in _runs(docs):
+        buf: List[Document] = []
+        size = 0
+        for d in run:
+            n = len(d.page_content or "")
+            if buf and size + n > chunk_size:
+                yield _joined(buf, "\n\n")
+                buf, size = [], 0
+            buf.append(d)
+            size += n + 2
+        if buf:
+            yield _joined(buf, "\n\n")
+
+
+def group_rows(docs: Iterable[Document], rows_per_chunk: int) -> Iterator[Document]:
+    for run in _runs(docs, "sheet"):
+        for i in range(0, len(run), rows_per_chunk):
+            group = run[i:i + rows_per_chunk]
+            out = _joined(group, "\n")
+            first, last = group[0].metadata, group[-1].metadata
+            if "row" in first:
+                out.metadata["row_start"] = first.get("row_start", first["row"])
+                out.metadata["row_end"] = last.get("row_end", last["row"])
+                out.metadata.pop("row", None)
+            yield out
+
+
+def group_time_window(docs: Iterable[Document], window_seconds: float) -> Iterator[Document]:
+    for run in _runs(docs):
+        buf: List[Document] = []
+        for d in run:
+            if buf and float(d.metadata.get("end", 0)) - float(buf[0].metadata.get("start", 0)) > window_seconds:
+                yield _window(buf)
+                buf = []
+            buf.append(d)
+        if buf:
+            yield _window(buf)
+
+
+def _joined(group: List[Document], sep: str) -> Document:
+    # always a new Document: callers update its metadata, the inputs are the loader's
+    md = dict(group[0].metadata or {})
+    if len(group) > 1:
+        md["element_count"] = len(group)
+    return Document(page_content=sep.join(d.page_content for d in group), metadata=md)
+
+
+def _window(group: List[Document]) -> Document:
+    out = _joined(group, " ")
+    if len(group) > 1:
+        out.metadata["end"] = group[-1].metadata.get("end")
+    return out
+
+
+def resolve_policy(chunking_cfg: dict, typ: str) -> dict:
+    base = dict(chunking_cfg.get("text") or {})
+    base.update((chunking_cfg.get("types") or {}).get(typ) or {})
+    return base
+
+
+def _pregroup(docs: List[Document], policy: dict) -> Iterable[Document]:
+    strategy = policy.get("strategy")
+    if strategy == "merge_elements":
+        return merge_elements(docs, policy["chunk_size"])
+    if strategy == "rows":
+        return group_rows(docs, int(policy.get("rows_per_chunk", 25)))
+    if strategy == "time_window":
+        return group_time_window(docs, float(policy.get("window_seconds", 60)))
+    return docs
+
+
+def chunk_documents(docs: List[Document], chunking_cfg: dict, compare: bool = False) -> Tuple[List[Document], Dict[str, Tuple[int, int]]]:
+    """
+    Chunk `docs` with their type's policy.
+    Returns (chunks, stats) with stats[type] = (chunks under chunking.text only, chunks now);
+    the baseline count (a second chunking pass) is only done with compare=True.
+    """
+    by_type: "OrderedDict[str, List[Document]]" = OrderedDict()
+    for d in docs:
+        by_type.setdefault((d.metadata or {}).get("type", "unknown"), []).append(d)
+
+    text_cfg = chunking_cfg.get("text") or {}
+    tokenizers: Dict[str, object] = {}
+
+    def length_fn(policy: dict):
+        if policy.get("length", "chars") != "tokens":
+            return None
+        name = policy.get("tokenizer", "cl100k_base")
+        if name not in tokenizers:
+            tokenizers[name] = token_length_function(name)
+        return tokenizers[name]
+
+    chunks: List[Document] = []
+    stats: Dict[str, Tuple[int, int]] = {}
+    for typ, group in by_type.items():
+        policy = resolve_policy(chunking_cfg, typ)
+        before = len(chunks)
+        chunks.extend(iter_chunks(_pregroup(group, policy), policy["chunk_size"], policy["overlap"], length_fn(policy)))
+        baseline = 0
+        if compare:
+            baseline = sum(1 for _ in iter_chunks(group, text_cfg["chunk_size"], text_cfg["overlap"], length_fn(text_cfg)))
+        stats[typ] = (baseline, len(chunks) - before)
+    return chunks, stats
@@ -1,12 +1,108 @@
-from typing import List
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from collections import deque
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 from langchain_core.documents import Document
 
-def chunk_text(docs: List[Document], chunk_size: int = 800, overlap: int = 80) -> List[Document]:
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=overlap,
-        length_function=len,
-        is_separator_regex=False,
-    )
-    return splitter.split_documents(docs)
+# Same separator ladder as LangChain's RecursiveCharacterTextSplitter.
+DEFAULT_SEPARATORS = ("\n\n", "\n", " ", "")
+
+# A token is never shorter than one character, and on real text rarely longer
+# than this many characters; spans above size * this are split without tokenizing.
+_MAX_CHARS_PER_TOKEN = 6
+
+
+def token_length_function(encoding: str = "cl100k_base") -> Callable[[str], int]:
+    """Token counter for sizing chunks against the LLM budget (tiktoken if available)."""
+    try:
+        import tiktoken
+    except ImportError:
+        print("⚠️ tiktoken not installed; estimating tokens as chars/4")
+        return lambda t: (len(t) + 3) // 4
+    enc = tiktoken.get_encoding(encoding)
+    return lambda t: len(enc.encode(t, disallowed_special=()))
+
+
+def _atoms(text: str, start: int, end: int, seps: Tuple[str, ...], size: int, span_len) -> Iterator[Tuple[int, int]]:
+    """Contiguous (start, end) spans covering text[start:end], split on the coarsest separator that fits."""
+    if end - start <= size or (end - start <= size * _MAX_CHARS_PER_TOKEN and span_len(start, end) <= size):
+        yield start, end
+        return
+    for i, sep in enumerate(seps):
+        if sep == "":
+            # No separator left: hard cut (size chars is <= size tokens as well)
+            for s in range(start, end, size):
+                yield s, min(s + size, end)
+            return
+        j = text.find(sep, start + 1, end)
+        if j == -1:
+            continue
+        rest = seps[i + 1:]
+        piece_start = start
+        while j != -1:
+            # separator stays at the start of the following piece (keep_separator=True)
+            yield from _atoms(text, piece_start, j, rest, size, span_len)
+            piece_start = j
+            j = text.find(sep, j + len(sep), end)
+        yield from _atoms(text, piece_start, end, rest, size, span_len)
+        return
+    yield start, end
+
+
+def _merge(spans: Iterable[Tuple[int, int]], size: int, overlap: int, span_len) -> Iterator[Tuple[int, int]]:
+    """Greedily pack atoms into windows of <= size, carrying <= overlap into the next window."""
+    window: deque = deque()
+    total = 0
+    for s, e in spans:
+        n = span_len(s, e)
+        if window and total + n > size:
+            yield window[0][0], window[-1][1]
+            while window and (total > overlap or total + n > size):
+                total -= window.popleft()[2]
+        window.append((s, e, n))
+        total += n
+    if window:
+        yield window[0][0], window[-1][1]
+
+
+def iter_chunks(
+    docs: Iterable[Document],
+    chunk_size: int = 800,
+    overlap: int = 80,
+    length_function: Optional[Callable[[str], int]] = None,
+    separators: Tuple[str, ...] = DEFAULT_SEPARATORS,
+) -> Iterator[Document]:
+    """
+    Stream chunks of `docs`. Each chunk carries `char_start`/`char_end` offsets into
+    its parent's page_content. Metadata is a shallow copy of the parent's (no deepcopy).
+    length_function=None measures characters; pass token_length_function() for tokens.
+    """
+    for doc in docs:
+        text = doc.page_content or ""
+        if length_function is None:
+            span_len = lambda s, e: e - s
+        else:
+            span_len = lambda s, e, _t=text: length_function(_t[s:e])
+
+        atoms = _atoms(text, 0, len(text), tuple(separators), chunk_size, span_len)
+        for s, e in _merge(atoms, chunk_size, overlap, span_len):
+            # strip whitespace but keep offsets pointing at the stripped text
+            while s < e and text[s].isspace():
+                s += 1
+            while e > s and text[e - 1].isspace():
+                e -= 1
+            if s == e:
+                continue
+            yield Document(
+                page_content=text[s:e],
+                metadata={**(doc.metadata or {}), "char_start": s, "char_end": e},
+            )
+
+
+def chunk_text(
+    docs: List[Document],
+    chunk_size: int = 800,
+    overlap: int = 80,
+    length: str = "chars",
+    tokenizer: str = "cl100k_base",
+) -> List[Document]:
+    length_function = token_length_function(tokenizer) if length == "tokens" else None
+    return list(iter_chunks(docs, chunk_size, overlap, length_function))
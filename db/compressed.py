@@ -0,0 +1,62 @@
+# db/compressed.py
+"""
+CompressedText: a Text-like column stored as a tagged BLOB.
+
+    b"p" + utf-8          short values (< COMPRESS_MIN bytes), not worth compressing
+    b"s" + zstd frame     when zstandard is installed
+    b"z" + zlib stream    fallback
+
+Reads decompress transparently. Rows written before the column was switched
+come back as str (SQLite keeps the old TEXT value) and are returned unchanged,
+so existing databases work before db/migrate_blobs.py has run. On Postgres
+db/init_db.py converts the old text columns to bytea, tagging values as b"p".
+"""
+import zlib
+from typing import Optional
+
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # zlib only
+    zstandard = None
+
+COMPRESS_MIN = 256
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 6
+
+
+def compress_text(value: str) -> bytes:
+    data = value.encode("utf-8")
+    if len(data) < COMPRESS_MIN:
+        return b"p" + data
+    if zstandard is not None:
+        return b"s" + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return b"z" + zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress_text(value) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    tag, body = value[:1], value[1:]
+    if tag == b"p":
+        return body.decode("utf-8")
+    if tag == b"z":
+        return zlib.decompress(body).decode("utf-8")
+    if tag == b"s":
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed column value but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(body).decode("utf-8")
+    return value.decode("utf-8", errors="replace")  # untagged legacy blob
+
+
+class CompressedText(TypeDecorator):
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
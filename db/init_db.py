@@ -1,9 +1,51 @@
 # db/init_db.py
+from sqlalchemy import inspect, text
 from db.session import engine
 from db.models import Base
+from db import search
+
+def _add_columns():
+    """Columns added after the first release (create_all doesn't alter tables)."""
+    cols = {c["name"] for c in inspect(engine).get_columns("chats")}
+    if "message_count" not in cols:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE chats ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0"))
+            conn.execute(text(
+                "UPDATE chats SET message_count = (SELECT count(*) FROM messages WHERE messages.chat_id = chats.id)"
+            ))
+
+# message columns switched from TEXT to CompressedText (a BLOB)
+BLOB_COLUMNS = ("content", "raw", "parsed_response")
+
+def _blob_columns():
+    """Postgres keeps the old `text` type (create_all doesn't alter), and bytea inserts
+    would fail. Convert in place, tagging old values as plain text (b"p" + utf-8).
+    SQLite stores bytes in a TEXT column as-is, so it needs no change."""
+    if engine.dialect.name != "postgresql":
+        return
+    types = {c["name"]: str(c["type"]).upper() for c in inspect(engine).get_columns("messages")}
+    todo = [c for c in BLOB_COLUMNS if c in types and types[c] != "BYTEA"]
+    if not todo:
+        return
+    with engine.begin() as conn:
+        for col in todo:
+            conn.execute(text(
+                f"ALTER TABLE messages ALTER COLUMN {col} TYPE bytea USING convert_to('p' || {col}, 'UTF8')"
+            ))
+    print(f"✅ Converted messages.{', messages.'.join(todo)} to bytea")
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _add_columns()
+    _blob_columns()
+    # create_all skips tables that already exist, so indexes added later
+    # to existing tables are created here
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    # FTS tables (SQLite); fill them once when added to an existing database
+    if search.create_index(engine):
+        search.rebuild_index(engine)
 
 if __name__ == "__main__":
     init_db()
@@ -0,0 +1,113 @@
+# db/migrate_blobs.py
+"""
+Rewrite existing chat messages into the compressed / de-duplicated layout.
+
+- assistant rows: raw is dropped when it equals content (it was a second copy
+  of the query stdout, which these older rows keep as content)
+- retrieved snippets in assistant output move to the `snippets` table
+  (keyed sha1:<hex>, since old rows don't know the chunk ids)
+- content / raw / parsed_response are rewritten through CompressedText
+- on Postgres the TEXT columns are first converted to bytea (init_db does this on
+  startup too; SQLite needs no schema change)
+- VACUUM, then database size and full-history read throughput before/after
+
+Idempotent; safe to run again.  Usage: python -m db.migrate_blobs [--batch 500]
+"""
+import os
+import re
+import time
+import argparse
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import undefer
+from sqlalchemy.orm.attributes import flag_modified
+
+from db.init_db import init_db
+from db.session import SessionLocal, engine
+from db.models import Message
+from db.snippets import CHUNKS_END, CHUNKS_START, pack, unpack
+
+ENTRY_RE = re.compile(r"^\[\d+\] .*? -> ", re.M)
+
+
+def legacy_snippets(stdout: str) -> List[Tuple[None, str]]:
+    """Snippets listed in the 'Retrieved chunks' block of an old query stdout."""
+    start = stdout.find(CHUNKS_START)
+    end = stdout.find("\n" + CHUNKS_END, start)
+    if start < 0 or end < 0:
+        return []
+    block = stdout[start + len(CHUNKS_START) + 1:end + 1]
+    entries = list(ENTRY_RE.finditer(block))
+    out = []
+    for i, m in enumerate(entries):
+        stop = entries[i + 1].start() if i + 1 < len(entries) else len(block)
+        snippet = block[m.end():stop].rstrip("\n")
+        out.append((None, snippet[:-1] if snippet.endswith("…") else snippet))
+    return out
+
+
+def db_bytes() -> int:
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            return conn.execute(text("PRAGMA page_count")).scalar() * conn.execute(text("PRAGMA page_size")).scalar()
+        return conn.execute(text("SELECT pg_database_size(current_database())")).scalar()
+
+
+def read_throughput() -> Tuple[int, float]:
+    """(messages, seconds) to read the whole history the way the API does."""
+    db = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        rows = db.query(Message).options(undefer(Message.raw)).order_by(Message.id).all()
+        unpack(db, [m.content for m in rows] + [m.raw for m in rows])
+        return len(rows), time.perf_counter() - t0
+    finally:
+        db.close()
+
+
+def _report(label: str, size: int, n: int, secs: float):
+    rate = n / secs if secs > 0 else 0.0
+    print(f"📊 {label}: {size / 1e6:.2f} MB, read {n} messages in {secs * 1000:.0f} ms ({rate:.0f} msg/s)")
+
+
+def migrate(batch: int = 500) -> None:
+    init_db()  # snippets table, indexes, bytea columns on Postgres
+    size0, (n0, t0) = db_bytes(), read_throughput()
+    _report("Before", size0, n0, t0)
+
+    last_id, changed = 0, 0
+    while True:
+        db = SessionLocal()
+        try:
+            rows = (db.query(Message).options(undefer(Message.raw))
+                    .filter(Message.id > last_id).order_by(Message.id).limit(batch).all())
+            if not rows:
+                break
+            for m in rows:
+                if m.role == "assistant":
+                    if m.raw is not None and m.raw == m.content:
+                        m.raw = None
+                    m.content = pack(db, m.content, legacy_snippets(m.content))
+                for col in ("content", "raw", "parsed_response"):
+                    flag_modified(m, col)  # rewrite old TEXT values compressed
+                changed += 1
+            last_id = rows[-1].id
+            db.commit()
+        finally:
+            db.close()
+    print(f"✅ Rewrote {changed} messages")
+
+    if engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+    size1, (n1, t1) = db_bytes(), read_throughput()
+    _report("After", size1, n1, t1)
+    if size0:
+        print(f"📉 {100 * (size0 - size1) / size0:.0f}% smaller")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Compress and de-duplicate stored chat messages.")
+    ap.add_argument("--batch", type=int, default=int(os.getenv("MIGRATE_BATCH", "500")))
+    migrate(ap.parse_args().batch)
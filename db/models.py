@@ -3,7 +3,8 @@ from datetime import datetime
 from sqlalchemy import (
     Column, Integer, String, DateTime, Boolean, ForeignKey, JSON, Text, Index
 )
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.orm import declarative_base, deferred, relationship
+from db.compressed import CompressedText
 
 Base = declarative_base()
 
@@ -14,12 +15,14 @@ class Chat(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     archived = Column(Boolean, default=False, nullable=False)
+    message_count = Column(Integer, default=0, server_default="0", nullable=False)
 
     messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
 
     __table_args__ = (
         Index("ix_chats_created_at", "created_at"),
         Index("ix_chats_archived", "archived"),
+        Index("ix_chats_archived_updated", "archived", "updated_at", "id"),   # listing sort + cursor
     )
 
 class Message(Base):
@@ -27,13 +30,21 @@ class Message(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     chat_id = Column(String(36), ForeignKey("chats.id", ondelete="CASCADE"), nullable=False)
     role = Column(String(16), nullable=False)          # "user" | "assistant" | "system"
-    content = Column(Text, nullable=False)             # what you show
-    raw = Column(Text)                                 # full stdout blob
-    parsed_response = Column(Text)                     # sanitized HTML/string you render
-    sources = Column(JSON)                             # list[str]
-    payload = Column(JSON)                             # request payload sent
+    content = Column(CompressedText, nullable=False)   # what you show (snippets as db.snippets refs)
+    raw = deferred(Column(CompressedText))             # CLI stdout if /query asked include_stdout (loaded on access)
+    parsed_response = Column(CompressedText)           # sanitized HTML/string you render
+    sources = Column(JSON)                             # list[dict] (query sources) or legacy list[str]
+    payload = deferred(Column(JSON))                   # request payload sent (loaded on access)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     chat = relationship("Chat", back_populates="messages")
 
+    # (chat_id, created_at) + implicit rowid = id serves the (created_at, id) cursor
     __table_args__ = (Index("ix_messages_chat_created", "chat_id", "created_at"),)
+
+class Snippet(Base):
+    """Retrieved-chunk text referenced from stored query output (see db/snippets.py)."""
+    __tablename__ = "snippets"
+    key = Column(String(512), primary_key=True)        # chunk id, or sha1:<hex> for legacy rows
+    text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,243 @@
+# db/search.py
+"""
+Full-text search over chat titles and message text (SQLite FTS5).
+
+    chats_fts(chat_id UNINDEXED, title)   joined on chats.id
+    messages_fts(body)                    rowid = messages.id
+
+(chats has a string primary key, so its implicit rowid may be renumbered by
+VACUUM; messages.id is an INTEGER PRIMARY KEY, i.e. the rowid itself.)
+
+The FTS tables store their own copy of the searchable text (message columns are
+compressed, so external-content FTS can't read them). They are kept in sync by
+mapper events on Chat/Message, inside the same transaction as the row change, so
+every insert/update/delete path (API, imports, db/migrate_blobs.py) is covered.
+For assistant output only the answer is indexed, not the retrieved-chunks block.
+
+search() returns bm25-ranked hits with highlighted snippets; other databases
+fall back to a title-only ILIKE. Usage: python -m db.search --rebuild
+"""
+import re
+import html
+import argparse
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import column, event, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from db.models import Chat, Message
+from db.snippets import CHUNKS_END, CHUNKS_START, REF_RE
+
+TOKENIZER = "unicode61 remove_diacritics 2"
+SNIPPET_TOKENS = 16
+MARK_OPEN, MARK_CLOSE = "\x02", "\x03"   # replaced by <mark> after HTML-escaping
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def enabled(bind) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+# --- Index text ---
+
+def searchable_text(role: str, content: Optional[str]) -> str:
+    """Message text as shown to the user: assistant output without the retrieved chunks."""
+    content = content or ""
+    if role == "assistant":
+        start = content.find(CHUNKS_START)
+        end = content.find(CHUNKS_END, start + 1) if start >= 0 else -1
+        if start >= 0 and end >= 0:
+            content = content[:start] + content[end + len(CHUNKS_END):]
+        content = REF_RE.sub(" ", content)
+    return content.strip()
+
+
+def fts_query(q: str) -> Optional[str]:
+    """User input -> FTS5 query: every word must match, the last one as a prefix."""
+    tokens = TOKEN_RE.findall(q or "")
+    if not tokens:
+        return None
+    quoted = [f'"{t}"' for t in tokens]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+# --- Schema / maintenance ---
+
+def create_index(bind: Engine) -> bool:
+    """Create the FTS tables; True if they were new (and need a rebuild)."""
+    if not enabled(bind):
+        return False
+    with bind.begin() as conn:
+        new = not conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='messages_fts'"
+        )).first()
+        old_chats = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='chats_fts' AND sql NOT LIKE '%chat_id%'"
+        )).first()
+        if old_chats:  # first version keyed titles by chats.rowid
+            conn.execute(text("DROP TABLE chats_fts"))
+            new = True
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS chats_fts USING fts5(chat_id UNINDEXED, title, tokenize='{TOKENIZER}')"
+        ))
+        conn.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(body, tokenize='{TOKENIZER}')"))
+    return new
+
+
+def rebuild_index(bind: Engine, batch: int = 1000) -> int:
+    """Re-index every chat and message (after creating the tables on an existing DB)."""
+    from sqlalchemy.orm import Session
+    if not enabled(bind):
+        return 0
+    create_index(bind)
+    n = 0
+    with Session(bind) as db:
+        conn = db.connection()
+        conn.execute(text("DELETE FROM chats_fts"))
+        conn.execute(text("DELETE FROM messages_fts"))
+        conn.execute(text("INSERT INTO chats_fts(chat_id, title) SELECT id, title FROM chats"))
+        last_id = 0
+        while True:
+            rows = (db.query(Message.id, Message.role, Message.content)
+                    .filter(Message.id > last_id).order_by(Message.id).limit(batch).all())
+            if not rows:
+                break
+            conn.execute(
+                text("INSERT INTO messages_fts(rowid, body) VALUES (:id, :body)"),
+                [{"id": r.id, "body": searchable_text(r.role, r.content)} for r in rows],
+            )
+            last_id, n = rows[-1].id, n + len(rows)
+        conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('optimize')"))
+        db.commit()
+    return n
+
+
+# --- Sync (mapper events, same connection/transaction as the row change) ---
+
+def _put_message(conn: Connection, m: Message):
+    conn.execute(text("DELETE FROM messages_fts WHERE rowid = :id"), {"id": m.id})
+    conn.execute(text("INSERT INTO messages_fts(rowid, body) VALUES (:id, :body)"),
+                 {"id": m.id, "body": searchable_text(m.role, m.content)})
+
+
+def _put_chat(conn: Connection, c: Chat):
+    conn.execute(text("DELETE FROM chats_fts WHERE chat_id = :id"), {"id": c.id})
+    conn.execute(text("INSERT INTO chats_fts(chat_id, title) VALUES (:id, :t)"), {"id": c.id, "t": c.title or ""})
+
+
+@event.listens_for(Message, "after_insert")
+def _message_inserted(mapper, conn, m):
+    if enabled(conn):
+        _put_message(conn, m)
+
+
+@event.listens_for(Message, "after_update")
+def _message_updated(mapper, conn, m):
+    if enabled(conn) and inspect(m).attrs.content.history.has_changes():
+        _put_message(conn, m)
+
+
+@event.listens_for(Message, "after_delete")
+def _message_deleted(mapper, conn, m):
+    if enabled(conn):
+        conn.execute(text("DELETE FROM messages_fts WHERE rowid = :id"), {"id": m.id})
+
+
+@event.listens_for(Chat, "after_insert")
+def _chat_inserted(mapper, conn, c):
+    if enabled(conn):
+        _put_chat(conn, c)
+
+
+@event.listens_for(Chat, "after_update")
+def _chat_updated(mapper, conn, c):
+    if enabled(conn) and inspect(c).attrs.title.history.has_changes():
+        _put_chat(conn, c)
+
+
+@event.listens_for(Chat, "before_delete")
+def _chat_deleted(mapper, conn, c):
+    if enabled(conn):
+        conn.execute(text("DELETE FROM chats_fts WHERE chat_id = :id"), {"id": c.id})
+
+
+# --- Query ---
+
+def _mark(s: Optional[str]) -> str:
+    return html.escape(s or "").replace(MARK_OPEN, "<mark>").replace(MARK_CLOSE, "</mark>")
+
+
+def matching_chat_ids(q: str):
+    """SELECT of chat ids whose title matches `q` (for list_chats ?q=)."""
+    return text(
+        "SELECT chat_id AS id FROM chats_fts WHERE chats_fts MATCH :fq"
+    ).bindparams(fq=fts_query(q) or '""').columns(column("id"))
+
+
+def _search_titles(conn: Connection, q: str, limit: int, offset: int, archived: Optional[bool]):
+    from sqlalchemy import select
+    qry = select(Chat.id, Chat.title, Chat.updated_at).where(Chat.title.ilike(f"%{q}%"))
+    if archived is not None:
+        qry = qry.where(Chat.archived == archived)
+    rows = conn.execute(qry.order_by(Chat.updated_at.desc()).limit(limit).offset(offset)).all()
+    return [{"kind": "chat", "chat_id": r.id, "chat_title": r.title, "message_id": None, "role": None,
+             "at": r.updated_at, "rank": 0.0, "snippet": html.escape(r.title)} for r in rows]
+
+
+def search(conn: Connection, q: str, limit: int = 20, offset: int = 0,
+           archived: Optional[bool] = None) -> List[Dict[str, Any]]:
+    """
+    Title and message hits for `q`, best first (bm25; a title hit weighs as much as
+    a message hit). Each side is ranked inside FTS5 with LIMIT, so the cost depends
+    on the page, not on how many rows match.
+    """
+    fq = fts_query(q)
+    if fq is None:
+        return []
+    if not enabled(conn):
+        return _search_titles(conn, q, limit, offset, archived)
+    n = offset + limit
+    arch = "" if archived is None else "AND c.archived = :archived"
+    params = {"fq": fq, "n": n, "archived": bool(archived)}
+    o, c = MARK_OPEN, MARK_CLOSE
+    chats = conn.execute(text(f"""
+        SELECT c.id AS chat_id, c.title AS chat_title, c.updated_at AS at, chats_fts.rank AS rank,
+               highlight(chats_fts, 1, '{o}', '{c}') AS snippet
+        FROM chats_fts JOIN chats c ON c.id = chats_fts.chat_id
+        WHERE chats_fts MATCH :fq {arch}
+        ORDER BY chats_fts.rank LIMIT :n
+    """), params).mappings().all()
+    messages = conn.execute(text(f"""
+        SELECT m.chat_id AS chat_id, c.title AS chat_title, m.id AS message_id, m.role AS role,
+               m.created_at AS at, messages_fts.rank AS rank,
+               snippet(messages_fts, 0, '{o}', '{c}', '…', {SNIPPET_TOKENS}) AS snippet
+        FROM messages_fts
+        JOIN messages m ON m.id = messages_fts.rowid
+        JOIN chats c ON c.id = m.chat_id
+        WHERE messages_fts MATCH :fq {arch}
+        ORDER BY messages_fts.rank LIMIT :n
+    """), params).mappings().all()
+
+    hits = [{"kind": "chat", "message_id": None, "role": None, **dict(r)} for r in chats]
+    hits += [{"kind": "message", **dict(r)} for r in messages]
+    hits.sort(key=lambda h: h["rank"])
+    page = hits[offset:n]
+    for h in page:
+        h["snippet"] = _mark(h["snippet"])
+        h["rank"] = round(-h["rank"], 4)   # higher = better for clients
+    return page
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Chat full-text search index.")
+    ap.add_argument("--rebuild", action="store_true", help="re-index all chats and messages")
+    ap.add_argument("query", nargs="?", help="run a search and print the hits")
+    args = ap.parse_args()
+    from db.session import engine
+    if args.rebuild:
+        print(f"✅ Indexed {rebuild_index(engine)} messages")
+    if args.query:
+        with engine.connect() as conn:
+            for h in search(conn, args.query):
+                print(f"{h['rank']:8.3f}  {h['kind']:<7} {h['chat_title']!r}: {h['snippet']}")
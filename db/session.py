@@ -1,8 +1,89 @@
-# db/session.py
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
 DB_URL = os.getenv("DATABASE_URL", "sqlite:///./opal.db")
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False} if DB_URL.startswith("sqlite") else {})
+
+# --- SQLite tuning (per connection) ---
+# WAL: readers don't block the writer and vice versa; NORMAL sync is durable in WAL
+# except for the last transactions on power loss; busy_timeout makes writers wait
+# for the lock instead of failing with "database is locked".
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))          # per uvicorn worker
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "32"))   # up to the sync threadpool (40)
+
+
+def _sqlite_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")
+    cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.close()
+
+
+def make_engine(url: str = DB_URL, tuned: bool = True):
+    if not url.startswith("sqlite"):
+        return create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
+    if not tuned:
+        return create_engine(url, connect_args={"check_same_thread": False})
+    in_memory = url in ("sqlite://", "sqlite:///:memory:")   # single shared connection, no pool sizing
+    eng = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        **({} if in_memory else {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}),
+    )
+    event.listen(eng, "connect", _sqlite_pragmas)
+    return eng
+
+
+engine = make_engine(DB_URL)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+
+# --- Async (API request handlers) ---
+# Same database through an async driver: aiosqlite for SQLite, asyncpg for Postgres.
+# Created on first use so CLI scripts don't need the async drivers.
+
+def async_url(url: str = DB_URL) -> str:
+    scheme, sep, rest = url.partition("://")
+    driver = {"sqlite": "sqlite+aiosqlite", "postgres": "postgresql+asyncpg",
+              "postgresql": "postgresql+asyncpg", "postgresql+psycopg2": "postgresql+asyncpg"}
+    return driver.get(scheme, scheme) + sep + rest
+
+
+def make_async_engine(url: str = DB_URL):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    aurl = async_url(url)
+    if not url.startswith("sqlite"):
+        return create_async_engine(aurl, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
+    in_memory = url in ("sqlite://", "sqlite:///:memory:")
+    eng = create_async_engine(
+        aurl,
+        connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        **({} if in_memory else {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}),
+    )
+    event.listen(eng.sync_engine, "connect", _sqlite_pragmas)
+    return eng
+
+
+_async_sessions = None
+
+
+def async_session_factory():
+    """async_sessionmaker bound to the shared async engine (created on first call)."""
+    global _async_sessions
+    if _async_sessions is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        _async_sessions = async_sessionmaker(make_async_engine(DB_URL), autoflush=False, expire_on_commit=False)
+    return _async_sessions
+
+
+async def get_async_db():
+    """FastAPI dependency: one AsyncSession per request."""
+    async with async_session_factory()() as db:
+        yield db
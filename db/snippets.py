@@ -0,0 +1,116 @@
+# db/snippets.py
+"""
+De-duplicated retrieved-chunk text in stored query output.
+
+The query stdout lists the retrieved snippets; the same chunks come back for many
+questions, so each snippet is stored once in `snippets` (keyed by chunk id) and the
+message text keeps a reference `\\x00snip:<key>\\x00` instead of a copy.
+
+    pack(db, text, [(chunk_id, snippet), ...])  -> text with references (adds rows)
+    unpack(db, texts)                           -> texts with snippets put back
+
+Structured query sources (Message.sources) keep a `snippet_key` instead of the text:
+
+    pack_sources(db, sources)                   -> sources without snippet text (adds rows)
+    unpack_sources(db, [sources, ...])          -> sources with `snippet` put back
+"""
+import re
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from db.models import Snippet
+
+MIN_SNIPPET_CHARS = 64          # shorter ones are cheaper inline than as a reference
+CHUNKS_START = "---- Retrieved chunks ----"   # block printed by query_data2._result
+CHUNKS_END = "--------------------------"
+REF_RE = re.compile(r"\x00snip:([^\x00]+)\x00")
+
+
+def _ref(key: str) -> str:
+    return f"\x00snip:{key}\x00"
+
+
+def snippet_key(chunk_id: Optional[str], text: str) -> str:
+    """Chunk ids already contain a content hash; text without one gets a sha1 key."""
+    return chunk_id or "sha1:" + hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def pack(db: Session, text: str, snippets: Iterable[Tuple[Optional[str], str]]) -> str:
+    """Replace the first occurrence of each snippet by a reference; store new snippets."""
+    if "\x00" in text:
+        return text  # can't tell references from content; keep it inline
+    found: Dict[str, str] = {}
+    for chunk_id, snippet in snippets:
+        if len(snippet) < MIN_SNIPPET_CHARS or snippet not in text:
+            continue
+        key = snippet_key(chunk_id, snippet)
+        if key in found and found[key] != snippet:
+            continue
+        text = text.replace(snippet, _ref(key), 1)
+        found[key] = snippet
+    store(db, found)
+    return text
+
+
+def store(db: Session, snippets: Dict[str, str]) -> None:
+    """Insert {key: text} rows that aren't stored yet."""
+    if not snippets:
+        return
+    # concurrent queries may store the same snippet: insert-or-ignore
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    rows = [{"key": k, "text": t} for k, t in snippets.items()]
+    db.execute(insert(Snippet).values(rows).on_conflict_do_nothing())
+
+
+def _lookup(db: Session, keys: Iterable[str]) -> Dict[str, str]:
+    keys = list(set(keys))
+    if not keys:
+        return {}
+    return dict(db.query(Snippet.key, Snippet.text).filter(Snippet.key.in_(keys)))
+
+
+def pack_sources(db: Session, sources: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Move each source's `snippet` to the snippets table, keeping `snippet_key`."""
+    out, found = [], {}
+    for src in sources:
+        src = dict(src)
+        snippet = src.get("snippet")
+        if snippet and len(snippet) >= MIN_SNIPPET_CHARS:
+            del src["snippet"]
+            key = snippet_key(src.get("chunk_id"), snippet)
+            found.setdefault(key, snippet)
+            src["snippet_key"] = key
+        out.append(src)
+    store(db, found)
+    return out
+
+
+def unpack_sources(db: Session, lists: Sequence[Optional[list]]) -> List[Optional[list]]:
+    """Put `snippet` back into stored sources with one lookup for all of them.
+    Legacy rows (plain strings) pass through unchanged."""
+    keys = [s["snippet_key"] for lst in lists if lst for s in lst if isinstance(s, dict) and s.get("snippet_key")]
+    if not keys:
+        return list(lists)
+    found = _lookup(db, keys)
+    return [
+        [{**s, "snippet": found.get(s["snippet_key"], "[snippet missing]")}
+         if isinstance(s, dict) and s.get("snippet_key") else s for s in lst] if lst else lst
+        for lst in lists
+    ]
+
+
+def unpack(db: Session, texts: Sequence[Optional[str]]) -> List[Optional[str]]:
+    """Expand references in `texts` with one lookup for all of them."""
+    keys = {k for t in texts if t and "\x00" in t for k in REF_RE.findall(t)}
+    if not keys:
+        return list(texts)
+    found = _lookup(db, keys)
+    return [
+        REF_RE.sub(lambda m: found.get(m.group(1), "[snippet missing]"), t) if t and "\x00" in t else t
+        for t in texts
+    ]
@@ -11,13 +11,39 @@
 
 
 import os
-from langchain_ollama import OllamaEmbeddings
+from typing import List
+from langchain_core.embeddings import Embeddings
+from embeddings.ollama_pool import get_pool
+
+
+class PooledOllamaEmbeddings(Embeddings):
+    """LangChain embeddings on the shared Ollama pool (keep-alive, limits, retries)."""
+
+    def __init__(self, model: str, base_url: str):
+        self.model = model
+        self.pool = get_pool(base_url)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.pool.embed(self.model, list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.pool.embed(self.model, [text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.pool.submit(self.pool.aembed(self.model, list(texts)))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.pool.submit(self.pool.aembed(self.model, [text])))[0]
+
+
+_embeddings = {}
 
 def get_embedding_function():
     base_url = os.getenv("OLLAMA_HOST", "http://h01.m5.jay-win.de:11434")  # <-- read env
     model = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")    # pick yours
 
-    return OllamaEmbeddings(
-        model=model,
-        base_url=base_url,  # <-- IMPORTANT
-    )
\ No newline at end of file
+    # one instance per (host, model): every Chroma handle shares the same pool
+    key = (base_url, model)
+    if key not in _embeddings:
+        _embeddings[key] = PooledOllamaEmbeddings(model=model, base_url=base_url)
+    return _embeddings[key]
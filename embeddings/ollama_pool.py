@@ -0,0 +1,209 @@
+# embeddings/ollama_pool.py
+"""
+One shared, pooled client for the Ollama host (embeddings + chat).
+
+- a single httpx.AsyncClient with keep-alive connection pooling, running on its
+  own event-loop thread so sync code (LangChain/Chroma, ingest, CLI) and async
+  code (FastAPI) share the same pool
+- separate concurrency limits for embed and generate requests; callers beyond the
+  limit queue on the semaphore (backpressure instead of flooding the host)
+- connect/read timeouts, retries with exponential backoff + full jitter on
+  connection errors and 429/502/503/504
+- counters per kind (in flight, waiting, peak waiting, retries, errors) via stats()
+  and on /metrics (opal_ollama_*, read at scrape time)
+
+Settings (env): OLLAMA_HOST, OLLAMA_EMBED_CONCURRENCY, OLLAMA_GENERATE_CONCURRENCY,
+OLLAMA_TIMEOUT, OLLAMA_CONNECT_TIMEOUT, OLLAMA_RETRIES, OLLAMA_KEEP_ALIVE.
+"""
+import os
+import time
+import random
+import asyncio
+import threading
+import concurrent.futures
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from telemetry.metrics import gauge_lines, register_collector
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://h01.m5.jay-win.de:11434")
+EMBED_CONCURRENCY = int(os.getenv("OLLAMA_EMBED_CONCURRENCY", "4"))
+GENERATE_CONCURRENCY = int(os.getenv("OLLAMA_GENERATE_CONCURRENCY", "2"))
+TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+RETRIES = int(os.getenv("OLLAMA_RETRIES", "3"))
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+EMBED_BATCH = 64                      # texts per /api/embed call
+RETRY_STATUS = {429, 502, 503, 504}
+BACKOFF_BASE, BACKOFF_CAP = 0.5, 8.0
+
+
+class OllamaError(RuntimeError):
+    pass
+
+
+class _Lane:
+    """Concurrency limit + counters for one request kind."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.sem: Optional[asyncio.Semaphore] = None   # created on the pool loop
+        self.in_flight = self.waiting = self.max_waiting = 0
+        self.requests = self.retries = self.errors = 0
+        self.wait_seconds = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit, "in_flight": self.in_flight, "waiting": self.waiting,
+            "max_waiting": self.max_waiting, "requests": self.requests, "retries": self.retries,
+            "errors": self.errors,
+            "avg_wait_ms": round(1000 * self.wait_seconds / self.requests, 1) if self.requests else 0.0,
+        }
+
+
+class OllamaPool:
+    def __init__(self, host: str = OLLAMA_HOST):
+        self.host = host.rstrip("/")
+        self.lanes = {"embed": _Lane(EMBED_CONCURRENCY), "generate": _Lane(GENERATE_CONCURRENCY)}
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        threading.Thread(target=self._run_loop, name="ollama-pool", daemon=True).start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        limits = httpx.Limits(
+            max_connections=EMBED_CONCURRENCY + GENERATE_CONCURRENCY,
+            max_keepalive_connections=EMBED_CONCURRENCY + GENERATE_CONCURRENCY,
+        )
+        self._client = httpx.AsyncClient(
+            base_url=self.host, limits=limits,
+            timeout=httpx.Timeout(TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+        for lane in self.lanes.values():
+            lane.sem = asyncio.Semaphore(lane.limit)
+        self._ready.set()
+        self._loop.run_forever()
+
+    # --- core request ---
+
+    async def _post(self, kind: str, path: str, payload: dict) -> dict:
+        lane = self.lanes[kind]
+        lane.waiting += 1
+        lane.max_waiting = max(lane.max_waiting, lane.waiting)
+        t0 = time.perf_counter()
+        async with lane.sem:
+            lane.waiting -= 1
+            lane.wait_seconds += time.perf_counter() - t0
+            lane.requests += 1
+            lane.in_flight += 1
+            try:
+                for attempt in range(RETRIES + 1):
+                    try:
+                        resp = await self._client.post(path, json=payload)
+                        if resp.status_code in RETRY_STATUS and attempt < RETRIES:
+                            raise httpx.HTTPStatusError("retryable", request=resp.request, response=resp)
+                        if resp.status_code >= 400:
+                            raise OllamaError(f"Ollama {path} -> HTTP {resp.status_code}: {resp.text[:300]}")
+                        return resp.json()
+                    except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                        # read timeouts are not retried: the host is busy, not gone
+                        if attempt >= RETRIES or isinstance(e, httpx.ReadTimeout):
+                            raise
+                        lane.retries += 1
+                        await asyncio.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+            except Exception:
+                lane.errors += 1
+                raise
+            finally:
+                lane.in_flight -= 1
+
+    # --- API (coroutines, run on the pool loop) ---
+
+    async def aembed(self, model: str, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + EMBED_BATCH] for i in range(0, len(texts), EMBED_BATCH)]
+        results = await asyncio.gather(*(
+            self._post("embed", "/api/embed", {"model": model, "input": b, "keep_alive": KEEP_ALIVE})
+            for b in batches
+        ))
+        return [vec for r in results for vec in r["embeddings"]]
+
+    async def achat(self, model: str, messages: List[dict], options: Optional[dict] = None) -> str:
+        r = await self._post("generate", "/api/chat", {
+            "model": model, "messages": messages, "options": options or {},
+            "stream": False, "keep_alive": KEEP_ALIVE,
+        })
+        return ((r.get("message") or {}).get("content") or "").strip()
+
+    async def agenerate(self, model: str, prompt: str, options: Optional[dict] = None) -> str:
+        r = await self._post("generate", "/api/generate", {
+            "model": model, "prompt": prompt, "options": options or {},
+            "stream": False, "keep_alive": KEEP_ALIVE,
+        })
+        return (r.get("response") or "").strip()
+
+    # --- bridges for callers on other threads / loops ---
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Block the calling (non-pool) thread until `coro` finished on the pool loop.
+        On timeout the coroutine is cancelled (frees its lane slot) and TimeoutError raised."""
+        fut = self.spawn(coro)
+        try:
+            return fut.result(timeout)
+        except concurrent.futures.TimeoutError:
+            fut.cancel()
+            raise
+
+    def spawn(self, coro) -> "concurrent.futures.Future":
+        """Start `coro` on the pool loop and return a thread-safe future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def submit(self, coro):
+        """Await `coro` from another event loop (e.g. an async FastAPI route)."""
+        return await asyncio.wrap_future(self.spawn(coro))
+
+    def embed(self, model: str, texts: List[str]) -> List[List[float]]:
+        return self.run(self.aembed(model, texts))
+
+    def chat(self, model: str, messages: List[dict], options: Optional[dict] = None) -> str:
+        return self.run(self.achat(model, messages, options))
+
+    def generate(self, model: str, prompt: str, options: Optional[dict] = None) -> str:
+        return self.run(self.agenerate(model, prompt, options))
+
+    def stats(self) -> Dict[str, Any]:
+        return {kind: lane.stats() for kind, lane in self.lanes.items()}
+
+
+_pools: Dict[str, OllamaPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(host: Optional[str] = None) -> OllamaPool:
+    """Process-wide pool per Ollama host."""
+    host = (host or OLLAMA_HOST).rstrip("/")
+    with _pools_lock:
+        if host not in _pools:
+            _pools[host] = OllamaPool(host)
+        return _pools[host]
+
+
+def _metrics():
+    with _pools_lock:
+        lanes = [(host, kind, lane) for host, pool in _pools.items() for kind, lane in pool.lanes.items()]
+    yield from gauge_lines("opal_ollama_waiting", "Ollama requests queued on the pool limit.",
+                           [({"host": h, "kind": k}, lane.waiting) for h, k, lane in lanes])
+    yield from gauge_lines("opal_ollama_in_flight", "Ollama requests being sent.",
+                           [({"host": h, "kind": k}, lane.in_flight) for h, k, lane in lanes])
+    yield from gauge_lines("opal_ollama_limit", "Concurrency limit per request kind.",
+                           [({"host": h, "kind": k}, lane.limit) for h, k, lane in lanes])
+    for name, attr, help in (("requests", "requests", "Ollama requests started."),
+                             ("retries", "retries", "Ollama request retries."),
+                             ("errors", "errors", "Ollama requests that failed."),
+                             ("wait_seconds", "wait_seconds", "Time spent queued on the pool limit.")):
+        yield from gauge_lines(f"opal_ollama_{name}_total", help,
+                               [({"host": h, "kind": k}, getattr(lane, attr)) for h, k, lane in lanes], kind="counter")
+
+
+register_collector(_metrics)
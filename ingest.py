@@ -1,10 +1,10 @@
-# ingest.py — minimal & robust for PDF/DOCX/TXT only
+# ingest.py — incremental ingest of data/ into the active Chroma snapshot
 
 import os
 import re
 import json
-import shutil
 import yaml
+import time
 import hashlib
 import argparse
 from pathlib import Path
@@ -13,13 +13,15 @@ from typing import List, Dict
 
 from langchain_core.documents import Document
 
-# Loaders (only the three we support in this minimal build)
-from loaders.pdf_loader import load_pdf
-from loaders.docx_loader import load_docx
-from loaders.txt_loader import load_txt
-
-from chunking.text_chunker import chunk_text
+from chunking.policies import chunk_documents
+from ingest_utils.loaders_map import build_loaders_map
+from ingest_utils.extract_cache import cached_load, lookup as lookup_extraction, store as store_extraction, DEFAULT_CACHE_DIR
 from vectordb.chroma_client import get_chroma
+from telemetry.metrics import CACHE_REQUESTS, LOAD_SECONDS, STAGE_SECONDS, stage_totals, timed, write_textfile
+from vectordb.snapshots import (
+    MANIFEST_NAME, current_index_dir, new_snapshot_dir, activate_snapshot,
+    discard_snapshot, gc_snapshots, DEFAULT_GC_GRACE_SECONDS,
+)
 
 
 # -------------------------
@@ -27,26 +29,25 @@ from vectordb.chroma_client import get_chroma
 # -------------------------
 
 PROJECT_ROOT = Path(__file__).resolve().parent
-MANIFEST_PATH = (PROJECT_ROOT / "chroma/.ingest_manifest.json").resolve()
 
 # -------------------------
 # Manifest helpers
 # -------------------------
 
-def load_manifest() -> dict:
-    if MANIFEST_PATH.exists():
+def load_manifest(path: Path) -> dict:
+    if path.exists():
         try:
-            return json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+            return json.loads(path.read_text(encoding="utf-8"))
         except Exception:
             return {}
     return {}
 
-def save_manifest(m: dict) -> None:
+def save_manifest(m: dict, path: Path) -> None:
     """Atomic write to avoid corruption on crash."""
-    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
-    tmp = MANIFEST_PATH.with_suffix(".tmp")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
     tmp.write_text(json.dumps(m, ensure_ascii=False, indent=2), encoding="utf-8")
-    tmp.replace(MANIFEST_PATH)
+    tmp.replace(path)
 
 # -------------------------
 # Signature / IDs
@@ -79,7 +80,7 @@ def short_hash(text: str) -> str:
 
 def build_locator(md: dict) -> str:
     parts = []
-    for key in ("page", "slide", "sheet", "row", "section", "element_id"):
+    for key in ("page", "slide", "sheet", "row", "row_start", "row_end", "section", "element_id", "json_path", "byte_start"):
         v = md.get(key)
         if v not in (None, "", "none"):
             parts.append(f"{key}={v}")
@@ -129,6 +130,21 @@ def normalize_basic_metadata(doc: Document, abs_path: Path, typ: str) -> None:
 # Chroma helpers
 # -------------------------
 
+def loader_name(loader) -> str:
+    # LazyLoader from the registry carries its config name (pdf, docx, ...)
+    return getattr(loader, "name", None) or getattr(loader, "__name__", "loader")
+
+def upsert_chunks(db, docs: List[Document]) -> None:
+    """Embed then write `docs` (timed separately; add_documents does both at once)."""
+    texts = [d.page_content for d in docs]
+    with timed(STAGE_SECONDS, pipeline="ingest", stage="embed"):
+        vectors = db.embeddings.embed_documents(texts)
+    with timed(STAGE_SECONDS, pipeline="ingest", stage="upsert"):
+        db._collection.upsert(
+            ids=[d.metadata["id"] for d in docs], embeddings=vectors,
+            metadatas=[d.metadata for d in docs], documents=texts,
+        )
+
 def delete_docs_for_source(db, source_path_str: str):
     try:
         db._collection.delete(where={"source": {"$eq": source_path_str}})
@@ -136,48 +152,68 @@ def delete_docs_for_source(db, source_path_str: str):
     except Exception as e:
         print(f"⚠️ Could not delete old chunks for {source_path_str}: {e}")
 
-# -------------------------
-# Loader map (PDF/DOCX/TXT only)
-# -------------------------
-
-def loader_for_ext(ext: str):
-    if ext == ".pdf":
-        return load_pdf, "pdf"
-    if ext == ".docx":
-        return load_docx, "docx"
-    if ext == ".txt":
-        return load_txt, "txt"
-    return None, None
-
-
+def delete_pages_for_source(db, source_path_str: str, pages: List[int]):
+    if not pages:
+        return
+    try:
+        db._collection.delete(where={"$and": [
+            {"source": {"$eq": source_path_str}},
+            {"page": {"$in": pages}},
+        ]})
+        print(f"🧹 Removed old chunks for {len(pages)} page(s) of {Path(source_path_str).name}")
+    except Exception as e:
+        print(f"⚠️ Could not delete old page chunks for {source_path_str}: {e}")
+
+def prefetch_batches(todo, cache_dir, refresh: bool, stats: list) -> Dict[Path, List[Document]]:
+    """
+    Run loaders that expose `.batch(paths)` once over all their pending files
+    (skipping extract-cache hits). Appends (name, files, seconds) to `stats`.
+    Files of a failed batch fall back to the per-file loader.
+    """
+    pending = defaultdict(list)
+    unavailable = set()
+    for path, _key, sig, loader in todo:
+        if id(loader) in unavailable:
+            continue
+        try:
+            # resolves a LazyLoader: its optional dependencies may be missing
+            batch = getattr(loader, "batch", None)
+        except ImportError as e:
+            unavailable.add(id(loader))
+            print(f"⚠️ Loader {loader_name(loader)} unavailable ({e}); its files will be skipped")
+            continue
+        if batch is None:
+            continue
+        if cache_dir is not None and not refresh and lookup_extraction(loader, path, sig, cache_dir) is not None:
+            continue
+        pending[batch].append(path)
 
-def build_loaders_map(loaders_cfg):
-    """Return only the enabled, minimal loaders (pdf/docx/txt) without importing others."""
-    m = {}
-    if loaders_cfg.get("pdf", False):
-        m[".pdf"] = load_pdf
-    if loaders_cfg.get("docx", False):
-        m[".docx"] = load_docx
-    if loaders_cfg.get("txt", False):
-        m[".txt"] = load_txt
-    return m
+    out: Dict[Path, List[Document]] = {}
+    for batch, paths in pending.items():
+        t0 = time.perf_counter()
+        try:
+            out.update(batch(paths))
+        except Exception as e:
+            print(f"⚠️ {batch.__name__} failed, loading files one by one: {e}")
+            continue
+        secs = time.perf_counter() - t0
+        stats.append((batch.__name__, len(paths), secs))
+        STAGE_SECONDS.observe(secs, pipeline="ingest", stage="load")
+        for _ in paths:
+            LOAD_SECONDS.observe(secs / len(paths), loader=batch.__name__)
+    return out
 
 
-from pathlib import Path
-import shutil
-import os
+# -------------------------
+# Snapshot helpers
+# -------------------------
 
-def _clear_dir(path: str | Path):
-    p = Path(path)
-    if not p.exists():
-        return
-    for child in p.iterdir():
-        if child.is_file() or child.is_symlink():
-            try: child.unlink()
-            except Exception: pass
-        else:
-            try: shutil.rmtree(child)
-            except Exception: pass
+def finish_run(manifest: dict, index_dir: Path, shadow: bool, chroma_path: str) -> None:
+    """Persist the manifest next to the index; a shadow build becomes live only now."""
+    save_manifest(manifest, index_dir / MANIFEST_NAME)
+    if shadow:
+        activate_snapshot(chroma_path, index_dir)
+        print(f"🔀 Switched live index to snapshot {index_dir.name}")
 
 
 # -------------------------
@@ -186,45 +222,102 @@ def _clear_dir(path: str | Path):
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--reset", action="store_true", help="Reset the database.")
+    parser.add_argument("--reset", action="store_true", help="Rebuild the database into a new snapshot and switch to it when done.")
     parser.add_argument("--rescan", action="store_true", help="Ignore manifest cache and rescan all files.")
+    parser.add_argument("--refresh-cache", action="store_true", help="Re-run loaders even if their output is cached.")
+    parser.add_argument("--compare-chunking", action="store_true", help="Also count chunks under chunking.text only (chunks everything twice).")
+    parser.add_argument("--export", dest="export_dir", metavar="DIR", help="Write the live index to a portable bundle and exit.")
+    parser.add_argument("--import", dest="import_dir", metavar="DIR", help="Load a bundle into a new snapshot and switch to it.")
     args = parser.parse_args()
 
     # --- Load config ---
     with open("config.yaml", "r", encoding="utf-8") as f:
         cfg = yaml.safe_load(f)
 
-    data_path = Path(cfg["data_path"])
     chroma_path = cfg["chroma_path"]
-    chunk_cfg = cfg["chunking"]["text"]
-    loaders_cfg = cfg["loaders"]
+    grace = (cfg.get("snapshots") or {}).get("gc_grace_seconds", DEFAULT_GC_GRACE_SECONDS)
+    for name in gc_snapshots(chroma_path, grace):
+        print(f"🗑️  Removed retired snapshot {name}")
+
+    # --- Bundle export/import (no loaders, no embedding calls) ---
+    if args.export_dir:
+        from ingest_utils.bundle import export_index
+        index_dir = current_index_dir(chroma_path)
+        n = export_index(
+            get_chroma(str(index_dir)), load_manifest(index_dir / MANIFEST_NAME),
+            Path(args.export_dir), str(Path(cfg["data_path"]).resolve()),
+        )
+        print(f"📦 Exported {n} chunks from {index_dir.name} to {args.export_dir}")
+        return
 
-    # --- Reset DB if requested ---
+    if args.import_dir:
+        from ingest_utils.bundle import import_index
+        index_dir = new_snapshot_dir(chroma_path)
+        print(f"📦 Importing {args.import_dir} into snapshot {index_dir.name}")
+        try:
+            manifest = import_index(get_chroma(str(index_dir)), Path(args.import_dir), str(Path(cfg["data_path"]).resolve()))
+            finish_run(manifest, index_dir, True, chroma_path)
+        except BaseException:
+            discard_snapshot(index_dir)
+            raise
+        return
 
+    # --- Reset builds a shadow snapshot; the live index keeps serving until the swap ---
     if args.reset:
-        print("=== 🚨 Ingest Mode: RESET (clear DB contents) ===")
-        print("✨ Clearing Database contents")
-        _clear_dir(chroma_path)
-        # Remove manifest file if present
+        print("=== 🚨 Ingest Mode: RESET (build new snapshot) ===")
+        index_dir = new_snapshot_dir(chroma_path)
+        print(f"✨ Building fresh index in {index_dir}")
+        try:
+            run_ingest(args, cfg, index_dir, shadow=True)
+        except BaseException:
+            discard_snapshot(index_dir)
+            raise
+        finally:
+            report_stages()
+    else:
         try:
-            Path("chroma/.ingest_manifest.json").unlink()
-        except FileNotFoundError:
-            pass
+            run_ingest(args, cfg, current_index_dir(chroma_path), shadow=False)
+        finally:
+            report_stages()
 
-    # --- Build extension → loader map ---
-    loaders_map = build_loaders_map(loaders_cfg)
+
+def report_stages():
+    """Print per-stage totals and leave them for the API's /metrics."""
+    for stage, (n, secs) in stage_totals("ingest").items():
+        print(f"⏱️  {stage}: {secs:.1f}s over {n} call(s)")
+    try:
+        write_textfile()
+    except OSError as e:
+        print(f"⚠️ Could not write ingest metrics: {e}")
+
+
+def run_ingest(args, cfg: dict, index_dir: Path, shadow: bool):
+    data_path = Path(cfg["data_path"])
+    chroma_path = cfg["chroma_path"]
+    chunking_cfg = cfg["chunking"]
+    loaders_cfg = cfg["loaders"]
+    cache_cfg = cfg.get("cache") or {}
+    use_cache = cache_cfg.get("enabled", True)
+    cache_dir = Path(cache_cfg.get("extracted_path", DEFAULT_CACHE_DIR))
+
+    # --- Build extension → loader map (loaders import on first matching file) ---
+    loaders_map = build_loaders_map(loaders_cfg, cfg.get("loader_options"))
 
     # --- Manifest ---
-    manifest = load_manifest()
+    manifest = load_manifest(index_dir / MANIFEST_NAME)
     current_seen = set()
 
     # --- Diagnostics collectors ---
     unsupported = []
     empty_or_whitespace = []
     ingested_files = 0
+    cache_hits = cache_misses = 0
+    partial_pages: Dict[str, List[int]] = {}  # source -> pages to replace (page-level re-ingest)
+    batch_stats = []  # (batch loader, files, seconds)
 
     # --- Walk data folder ---
     all_docs: List[Document] = []
+    todo = []  # (path, manifest key, signature, loader) for new/changed files
     SKIP_SUFFIXES = {".docx#", ".backup"}
 
     for path in data_path.rglob("*"):
@@ -247,8 +340,35 @@ def main():
                 current_seen.add(key)
                 continue
 
+        todo.append((path, key, sig, loader))
+
+    # --- Batch-capable loaders (e.g. OCR worker pool) extract all their files up front ---
+    prefetched = prefetch_batches(todo, cache_dir if use_cache else None, args.refresh_cache, batch_stats)
+
+    for path, key, sig, loader in todo:
         try:
-            docs = loader(path)
+            t0 = time.perf_counter()
+            hit = False
+            if path in prefetched:
+                docs = prefetched.pop(path)  # load already timed per batch
+                if use_cache:
+                    store_extraction(loader, path, sig, cache_dir, docs)
+                    cache_misses += 1
+                    CACHE_REQUESTS.inc(cache="extract", result="miss")
+            else:
+                if use_cache:
+                    docs, hit = cached_load(loader, path, sig, cache_dir, refresh=args.refresh_cache)
+                    if hit:
+                        cache_hits += 1
+                    else:
+                        cache_misses += 1
+                    CACHE_REQUESTS.inc(cache="extract", result="hit" if hit else "miss")
+                else:
+                    docs = loader(path)
+                secs = time.perf_counter() - t0
+                STAGE_SECONDS.observe(secs, pipeline="ingest", stage="load")
+                if not hit:
+                    LOAD_SECONDS.observe(secs, loader=loader_name(loader))
 
             if path.suffix.lower() == ".txt" and not docs:
                 try:
@@ -259,8 +379,22 @@ def main():
                 except Exception:
                     empty_or_whitespace.append(f"{path.name} (unknown size)")
 
+            rec = {"sig": sig}
+            page_hashes = {str(d.metadata["page"]): d.metadata["page_hash"] for d in docs if "page_hash" in d.metadata}
+            if page_hashes:
+                rec["pages"] = page_hashes
+                old_pages = (manifest.get(key) or {}).get("pages")
+                if old_pages and not args.rescan:
+                    # Only pages whose extracted text changed get re-chunked and re-embedded
+                    changed = {p for p, h in page_hashes.items() if old_pages.get(p) != h}
+                    dropped = set(old_pages) - set(page_hashes)
+                    src = docs[0].metadata.get("source", str(path))
+                    partial_pages[src] = sorted(int(p) for p in changed | dropped)
+                    docs = [d for d in docs if str(d.metadata.get("page")) in changed]
+                    print(f"📄 {path.name}: {len(changed)} changed, {len(dropped)} removed of {len(page_hashes)} pages")
+
             docs = [d for d in docs if (d.page_content or "").strip()]
-            manifest[key] = {"sig": sig}
+            manifest[key] = rec
             current_seen.add(key)
 
             if docs:
@@ -276,7 +410,7 @@ def main():
     # --- Clean up removed files ---
     removed = set(manifest.keys()) - current_seen
     if removed:
-        db = get_chroma(chroma_path)
+        db = get_chroma(str(index_dir))
         for dead in removed:
             try:
                 db._collection.delete(where={"source": {"$eq": dead}})
@@ -287,6 +421,10 @@ def main():
 
     # --- Report diagnostics ---
     print(f"Scan summary: {ingested_files} candidate files, {len(unsupported)} unsupported, {len(empty_or_whitespace)} empty/whitespace")
+    if use_cache and (cache_hits or cache_misses):
+        print(f"Extract cache: {cache_hits} hits, {cache_misses} misses ({cache_dir})")
+    for name, n, secs in batch_stats:
+        print(f"Throughput {name}: {n} files in {secs:.1f}s ({n / max(secs, 1e-9):.2f} files/s)")
 
     if unsupported:
         print("↪ Unsupported examples:")
@@ -299,45 +437,69 @@ def main():
             print("  -", p)
 
     if not all_docs:
+        if partial_pages:
+            db = get_chroma(str(index_dir))
+            for src, pages in partial_pages.items():
+                delete_pages_for_source(db, src, pages)
         print("No new/changed documents to (re)chunk. Saving manifest and exiting.")
-        save_manifest(manifest)
+        finish_run(manifest, index_dir, shadow, chroma_path)
         return
 
     # --- Chunking & assign IDs ---
-    chunks = chunk_text(all_docs, chunk_cfg["chunk_size"], chunk_cfg["overlap"])
-    chunks = assign_ids(chunks)
+    with timed(STAGE_SECONDS, pipeline="ingest", stage="chunk"):
+        chunks, chunk_stats = chunk_documents(all_docs, chunking_cfg, compare=args.compare_chunking)
+        chunks = assign_ids(chunks)
 
     by_source = Counter(d.metadata.get("source", "unknown") for d in chunks)
     for src, n in by_source.items():
         print(f"{n}: Chunks for {Path(src).name}")
     print(f"Total chunks: {len(chunks)}")
+    if args.compare_chunking:
+        print("Chunks per type (chunking.text only → type policy):")
+        for typ, (baseline, actual) in chunk_stats.items():
+            print(f"  - {typ}: {baseline} → {actual}")
+    else:
+        print("Chunks per type: " + ", ".join(f"{typ} {actual}" for typ, (_, actual) in chunk_stats.items()))
 
     # --- Upsert to Chroma ---
-    db = get_chroma(chroma_path)
+    db = get_chroma(str(index_dir))
     existing = db.get(include=[])
     existing_ids = set(existing.get("ids", []))
-    new_docs = [c for c in chunks if c.metadata["id"] not in existing_ids]
 
-    if not new_docs:
+    by_source_all = defaultdict(list)
+    for d in chunks:
+        by_source_all[d.metadata.get("source", "unknown")].append(d)
+
+    # A source is rewritten when any of its chunks is new; it then gets all of its
+    # chunks back, not only the new ones. Page-level sources only touch their pages.
+    by_source_new = {
+        src: docs_for_src for src, docs_for_src in by_source_all.items()
+        if src in partial_pages or any(d.metadata["id"] not in existing_ids for d in docs_for_src)
+    }
+    pages_only = [src for src in partial_pages if src not in by_source_all]
+
+    if not by_source_new and not pages_only:
         print("✅ No new documents to add")
-        save_manifest(manifest)
+        finish_run(manifest, index_dir, shadow, chroma_path)
         return
 
-    from collections import defaultdict
-    by_source_new = defaultdict(list)
-    for d in new_docs:
-        by_source_new[d.metadata.get("source", "unknown")].append(d)
+    n_new = sum(len(v) for v in by_source_new.values())
+    print(f"👉 Adding new documents: {n_new} (grouped across {len(by_source_new)} sources)")
 
-    print(f"👉 Adding new documents: {len(new_docs)} (grouped across {len(by_source_new)} sources)")
+    for src in pages_only:
+        delete_pages_for_source(db, src, partial_pages[src])
 
     for src, docs_for_src in by_source_new.items():
-        delete_docs_for_source(db, src)
+        if src in partial_pages:
+            delete_pages_for_source(db, src, partial_pages[src])
+        else:
+            delete_docs_for_source(db, src)
         for d in docs_for_src:
             d.metadata = sanitize_metadata(d.metadata)
-        db.add_documents(docs_for_src, ids=[d.metadata["id"] for d in docs_for_src])
+        upsert_chunks(db, docs_for_src)
         print(f"✅ Upserted {len(docs_for_src)} chunks for {Path(src).name}")
 
-    save_manifest(manifest)
+    finish_run(manifest, index_dir, shadow, chroma_path)
 
 if __name__ == "__main__":
     main()
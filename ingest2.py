@@ -7,7 +7,7 @@ from collections import Counter
 from typing import List
 from langchain_core.documents import Document
 
-from chunking.text_chunker import chunk_text
+from chunking.policies import chunk_documents
 from vectordb.chroma_client import get_chroma
 
 # our new utils
@@ -29,7 +29,6 @@ def main():
 
     data_path = Path(cfg["data_path"])
     chroma_path = cfg["chroma_path"]
-    chunk_cfg = cfg["chunking"]["text"]
     loaders_cfg = cfg["loaders"]
 
     # --- Reset DB if requested ---
@@ -42,7 +41,7 @@ def main():
             pass
 
     # --- Build extension → loader map ---
-    loaders_map = build_loaders_map(loaders_cfg)
+    loaders_map = build_loaders_map(loaders_cfg, cfg.get("loader_options"))
 
     # --- Manifest ---
     manifest = load_manifest()
@@ -99,7 +98,7 @@ def main():
         return
 
     # --- Chunking & assign IDs ---
-    chunks = chunk_text(all_docs, chunk_cfg["chunk_size"], chunk_cfg["overlap"])
+    chunks, _ = chunk_documents(all_docs, cfg["chunking"], compare=False)
     chunks = assign_ids(chunks)
 
     by_source = Counter(d.metadata.get("source", "unknown") for d in chunks)
@@ -0,0 +1,155 @@
+"""
+Portable index bundles for `ingest.py --export DIR` / `ingest.py --import DIR`.
+
+Bundle layout:
+    bundle.json      - format version, counts, embedding dim/model, data root
+    chunks.parquet   - id, document, metadata (sanitised JSON), zstd-compressed
+    embeddings.npy   - float32 [n, dim], row i belongs to chunks row i (mmap-able)
+    manifest.json    - the ingest manifest of the exported snapshot
+
+pyarrow/numpy are only imported here, so normal ingest runs don't need them.
+"""
+import os
+import json
+import time
+from pathlib import Path
+
+from ingest_utils.manifest import file_signature
+
+BUNDLE_VERSION = 1
+BATCH_SIZE = 2000
+
+
+def _rebase(s: str, old_root: str, new_root: str) -> str:
+    # only on a path boundary: root "data" must not rewrite "data2/x"
+    old, new = old_root.rstrip("/"), new_root.rstrip("/")
+    if not old or old == new:
+        return s
+    if s == old or s.startswith(old + "/"):
+        return new + s[len(old):]
+    return s
+
+
+def export_index(db, manifest: dict, out_dir: Path, data_root: str) -> int:
+    """Stream the collection into a bundle directory. Returns number of chunks."""
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    col = db._collection
+    total = col.count()
+
+    schema = pa.schema([("id", pa.string()), ("document", pa.string()), ("metadata", pa.string())])
+    writer = pq.ParquetWriter(str(out_dir / "chunks.parquet"), schema, compression="zstd")
+    emb = None
+    written = 0
+    try:
+        for offset in range(0, total, BATCH_SIZE):
+            res = col.get(include=["documents", "metadatas", "embeddings"], limit=BATCH_SIZE, offset=offset)
+            ids = res["ids"]
+            if not ids:
+                break
+            vecs = np.asarray(res["embeddings"], dtype=np.float32)
+            if emb is None:
+                emb = np.lib.format.open_memmap(
+                    str(out_dir / "embeddings.npy"), mode="w+", dtype=np.float32, shape=(total, vecs.shape[1])
+                )
+            emb[written:written + len(ids)] = vecs
+            writer.write_table(pa.table({
+                "id": ids,
+                "document": res["documents"],
+                "metadata": [json.dumps(md or {}, ensure_ascii=False) for md in res["metadatas"]],
+            }, schema=schema))
+            written += len(ids)
+    finally:
+        writer.close()
+        if emb is not None:
+            emb.flush()
+            del emb
+
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    (out_dir / "bundle.json").write_text(json.dumps({
+        "version": BUNDLE_VERSION,
+        "count": written,
+        "dim": int(vecs.shape[1]) if written else 0,
+        "embed_model": os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text"),
+        "data_root": data_root,
+        "created": time.time(),
+    }, indent=2), encoding="utf-8")
+    return written
+
+
+def import_index(db, bundle_dir: Path, data_root: str) -> dict:
+    """
+    Bulk-load a bundle into `db` (normally a fresh shadow snapshot).
+    Paths are rebased from the exporting node's data root onto `data_root`.
+    Returns the manifest to store next to the imported index.
+    """
+    import numpy as np
+    import pyarrow.parquet as pq
+
+    bundle_dir = Path(bundle_dir)
+    info = json.loads((bundle_dir / "bundle.json").read_text(encoding="utf-8"))
+    if info.get("version") != BUNDLE_VERSION:
+        raise RuntimeError(f"Unsupported bundle version {info.get('version')} (expected {BUNDLE_VERSION})")
+    model = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+    if info.get("embed_model") != model:
+        print(f"⚠️ Bundle was embedded with '{info.get('embed_model')}', this node queries with '{model}'")
+
+    old_root = info.get("data_root") or ""
+    emb = np.load(str(bundle_dir / "embeddings.npy"), mmap_mode="r") if info.get("count") else None
+
+    col = db._collection
+    try:
+        batch_size = min(BATCH_SIZE, db._client.get_max_batch_size())
+    except Exception:
+        batch_size = BATCH_SIZE
+
+    row = 0
+    for batch in pq.ParquetFile(str(bundle_dir / "chunks.parquet")).iter_batches(batch_size=batch_size):
+        cols = batch.to_pydict()
+        n = len(cols["id"])
+        metas = []
+        for raw in cols["metadata"]:
+            md = json.loads(raw)
+            if "source" in md:
+                md["source"] = _rebase(md["source"], old_root, data_root)
+            if "id" in md:
+                md["id"] = _rebase(md["id"], old_root, data_root)
+            metas.append(md)
+        col.upsert(
+            ids=[_rebase(i, old_root, data_root) for i in cols["id"]],
+            documents=cols["document"],
+            metadatas=metas,
+            embeddings=np.ascontiguousarray(emb[row:row + n]),
+        )
+        row += n
+        print(f"📥 Imported {row}/{info['count']} chunks")
+
+    manifest = json.loads((bundle_dir / "manifest.json").read_text(encoding="utf-8"))
+    return _restamp_manifest(
+        {_rebase(k, old_root, data_root): v for k, v in manifest.items()}
+    )
+
+
+def _restamp_manifest(manifest: dict) -> dict:
+    """
+    Copied files usually get new mtimes; keep entries whose size+content hash match
+    so the next incremental ingest doesn't re-embed the whole corpus.
+    """
+    for key, rec in manifest.items():
+        p = Path(key)
+        old = (rec or {}).get("sig") or ""
+        if not p.is_file() or old.count(":") < 2:
+            continue
+        try:
+            new = file_signature(p)
+        except OSError:
+            continue
+        o_size, _, o_fp = old.split(":", 2)
+        n_size, _, n_fp = new.split(":", 2)
+        if (o_size, o_fp) == (n_size, n_fp) and o_fp != "nofp":
+            rec["sig"] = new
+    return manifest
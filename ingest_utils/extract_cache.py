@@ -0,0 +1,99 @@
+"""
+On-disk cache of loader output (page_content + metadata per Document).
+
+Entries are keyed by source path + content signature + loader identity/version,
+so re-chunking or re-embedding (--rescan after a chunk_size change) never re-runs
+LibreOffice, tesseract or whisper for bytes we already extracted.
+Bump LOADER_VERSION in a loader module whenever its output format changes.
+"""
+import sys
+import gzip
+import json
+import hashlib
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+CACHE_FORMAT = 1
+DEFAULT_CACHE_DIR = "cache/extracted"
+FULL_HASH_MAX = 16 * 1024 * 1024   # file_signature hashes whole files up to this size
+
+
+def loader_id(loader: Callable) -> str:
+    loader = loader.resolve() if hasattr(loader, "resolve") else loader  # LazyLoader from the registry
+    mod = sys.modules.get(getattr(loader, "__module__", ""), None)
+    version = getattr(mod, "LOADER_VERSION", 1)
+    ident = f"{getattr(loader, '__module__', '?')}.{getattr(loader, '__name__', '?')}:v{version}"
+    options = getattr(loader, "keywords", None)  # functools.partial from loader_options
+    if options:
+        ident += ":" + json.dumps(options, sort_keys=True, default=str)
+    return ident
+
+
+def cache_key(path: Path, sig: str, loader: Callable) -> Optional[str]:
+    """None when the signature has no content hash (unreadable file)."""
+    size, mtime, fp = sig.split(":", 2) if sig.count(":") >= 2 else ("", "", "nofp")
+    if fp == "nofp":
+        return None
+    # mtime is left out when fp hashes the whole file: touching it must not invalidate
+    # its extraction. Above FULL_HASH_MAX fp only samples head + tail, so a same-size
+    # edit in the middle would hit; keep mtime in the key there.
+    if not size.isdigit() or int(size) > FULL_HASH_MAX:
+        fp = f"{fp}@{mtime}"
+    raw = f"{CACHE_FORMAT}|{path.resolve()}|{size}|{fp}|{loader_id(loader)}"
+    return hashlib.sha1(raw.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def _entry(cache_dir: Path, key: str) -> Path:
+    return Path(cache_dir) / key[:2] / f"{key}.json.gz"
+
+
+def get(cache_dir: Path, key: str) -> Optional[List[Document]]:
+    p = _entry(cache_dir, key)
+    if not p.exists():
+        return None
+    try:
+        with gzip.open(p, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        return [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in data["docs"]]
+    except Exception:
+        return None  # corrupt/partial entry -> treat as miss
+
+
+def put(cache_dir: Path, key: str, docs: List[Document]) -> None:
+    p = _entry(cache_dir, key)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(".tmp")
+    payload = {"docs": [{"page_content": d.page_content, "metadata": d.metadata or {}} for d in docs]}
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump(payload, f, ensure_ascii=False, default=str)
+    tmp.replace(p)
+
+
+def lookup(loader: Callable, path: Path, sig: str, cache_dir: Path) -> Optional[List[Document]]:
+    key = cache_key(path, sig, loader)
+    return get(cache_dir, key) if key else None
+
+
+def store(loader: Callable, path: Path, sig: str, cache_dir: Path, docs: List[Document]) -> None:
+    key = cache_key(path, sig, loader)
+    # empty output is not cached: loaders return [] on errors (and OCR when it skips
+    # an image), and that must not stick for the file's content hash
+    if not key or not docs:
+        return
+    try:
+        put(cache_dir, key, docs)
+    except Exception as e:
+        print(f"⚠️ Could not cache extraction for {path.name}: {e}")
+
+
+def cached_load(loader: Callable, path: Path, sig: str, cache_dir: Path, refresh: bool = False) -> Tuple[List[Document], bool]:
+    """Run `loader(path)` through the cache. Returns (docs, cache_hit)."""
+    if not refresh:
+        docs = lookup(loader, path, sig, cache_dir)
+        if docs is not None:
+            return docs, True
+    docs = loader(path)
+    store(loader, path, sig, cache_dir, docs)
+    return docs, False
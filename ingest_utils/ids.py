@@ -2,9 +2,12 @@ import hashlib
 from collections import defaultdict
 from langchain_core.documents import Document
 
+# metadata keys that say where in its file a chunk comes from
+LOCATOR_KEYS = ("page", "slide", "sheet", "row", "row_start", "row_end", "section", "element_id", "json_path", "byte_start")
+
 def build_locator(md: dict) -> str:
     parts = []
-    for key in ("page", "slide", "sheet", "row", "section", "element_id"):
+    for key in LOCATOR_KEYS:
         if key in md and md[key] not in (None, ""):
             parts.append(f"{key}={md[key]}")
     return ";".join(parts) if parts else ""
@@ -1,69 +1,102 @@
+"""
+Lazy loader registry.
+
+Loaders are registered as import paths and only imported when a file with one of
+their extensions is actually met, so a disabled (or unused) loader never pulls in
+faster-whisper, tesseract/PIL, pandas or Unstructured.
+
+Third-party loaders can register through the `rag_backend.loaders` entry-point
+group; the entry-point name is the extension without the dot:
+
+    [project.entry-points."rag_backend.loaders"]
+    foo = "my_pkg.foo_loader:load_foo"
+
+They are on unless config.yaml sets `loaders.<name>: false`, and get
+`loader_options.<name>` as keyword arguments like built-in loaders.
+"""
+import functools
+import importlib
+from importlib.metadata import entry_points
 from pathlib import Path
-from typing import Callable, Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
 from langchain_core.documents import Document
 
-# Loaders (only those you actually enable via config will be used)
-from loaders.pdf_loader import load_pdf
-from loaders.docx_loader import load_docx
-from loaders.pptx_loader import load_pptx
-from loaders.html_loader import load_html
-from loaders.csv_loader import load_csv
-from loaders.md_loader import load_md
-from loaders.txt_loader import load_txt
-from loaders.rtf_loader import load_rtf
-from loaders.eml_loader import load_eml
-from loaders.excel_loader import load_excel
-from loaders.image_ocr_loader import load_image_ocr
-from loaders.video_loader import load_mp4
-from loaders.doc_loader import load_doc
-from loaders.json_loader import load_json
-
-
-def build_loaders_map(loaders_cfg: dict) -> Dict[str, Callable[[Path], List[Document]]]:
+ENTRY_POINT_GROUP = "rag_backend.loaders"
+
+# config name -> (import path, extensions, enabled when config.yaml doesn't say)
+LOADER_SPECS: Dict[str, Tuple[str, Tuple[str, ...], bool]] = {
+    "txt":        ("loaders.txt_loader:load_txt",             (".txt", ".text", ".log"), True),
+    "pdf":        ("loaders.pdf_loader:load_pdf",             (".pdf",), True),
+    "docx":       ("loaders.docx_loader:load_docx",           (".docx",), True),
+    "json":       ("loaders.json_loader:load_json",           (".json", ".jsonl", ".ndjson"), True),
+    "doc":        ("loaders.doc_loader:load_doc",             (".doc",), True),
+    "md":         ("loaders.md_loader:load_md",               (".md",), True),
+    "pptx":       ("loaders.pptx_loader:load_pptx",           (".pptx",), False),
+    "html":       ("loaders.html_loader:load_html",           (".html", ".htm"), False),
+    "csv":        ("loaders.csv_loader:load_csv",             (".csv",), False),
+    "rtf":        ("loaders.rtf_loader:load_rtf",             (".rtf",), False),
+    "eml":        ("loaders.eml_loader:load_eml",             (".eml",), False),
+    "excel":      ("loaders.excel_loader:load_excel",         (".xlsx", ".xls"), False),
+    "images_ocr": ("loaders.image_ocr_loader:load_image_ocr", (".png", ".jpg", ".jpeg", ".webp"), False),
+    "video":      ("loaders.video_loader:load_mp4",           (".mp4",), False),
+}
+
+
+def _with_options(fn: Callable, opts: Optional[dict]) -> Callable:
+    """Bind config.yaml loader_options.<name> as keyword args, keeping the loader's name/module."""
+    if not opts:
+        return fn
+    return functools.update_wrapper(functools.partial(fn, **opts), fn)
+
+
+class LazyLoader:
+    """Stands in for a loader function; imports `target` ("module:function") on first use."""
+
+    def __init__(self, name: str, target: str, options: Optional[dict] = None):
+        self.name = name
+        self.target = target
+        self.options = options or {}
+        self._fn: Optional[Callable] = None
+
+    def resolve(self) -> Callable:
+        if self._fn is None:
+            module, _, attr = self.target.partition(":")
+            self._fn = _with_options(getattr(importlib.import_module(module), attr), self.options)
+        return self._fn
+
+    def __call__(self, path: Path) -> List[Document]:
+        return self.resolve()(path)
+
+    def __getattr__(self, item):
+        # __name__, keywords, batch, ... come from the real loader
+        return getattr(self.resolve(), item)
+
+    def __repr__(self):
+        return f"<LazyLoader {self.name} -> {self.target}{' (loaded)' if self._fn else ''}>"
+
+
+def _plugin_specs() -> Dict[str, Tuple[str, Tuple[str, ...], bool]]:
+    specs = {}
+    for ep in entry_points(group=ENTRY_POINT_GROUP):
+        specs[ep.name] = (ep.value, ("." + ep.name.lower().lstrip("."),), True)
+    return specs
+
+
+def build_loaders_map(loaders_cfg: dict, loader_options: Optional[dict] = None) -> Dict[str, Callable[[Path], List[Document]]]:
     """
-    Build extension -> loader map based on config flags.
+    Build extension -> loader map based on config flags. Nothing is imported here.
     NOTE: Path.suffix is lowercased by the caller; we still define keys lowercase.
     """
     loaders_map: Dict[str, Callable[[Path], List[Document]]] = {}
+    opts = loader_options or {}
+    specs = {**_plugin_specs(), **LOADER_SPECS}  # built-ins win on name clashes
 
-    # Core you said you want
-    if loaders_cfg.get("txt", True):
-        loaders_map.update({
-            ".txt": load_txt,
-            ".text": load_txt,   # alias
-            ".log": load_txt,    # alias
-        })
-    if loaders_cfg.get("pdf", True):
-        loaders_map[".pdf"] = load_pdf
-    if loaders_cfg.get("docx", True):
-        loaders_map[".docx"] = load_docx
-    if loaders_cfg.get("json", True):
-        loaders_map[".json"] = load_json
-
-
-    # Optional (kept, but default False—enable in config.yaml if needed)
-    if loaders_cfg.get("doc", True):
-        loaders_map[".doc"] = load_doc
-    if loaders_cfg.get("pptx", False):
-        loaders_map[".pptx"] = load_pptx
-    if loaders_cfg.get("html", False):
-        loaders_map.update({".html": load_html, ".htm": load_html})
-    if loaders_cfg.get("csv", False):
-        loaders_map[".csv"] = load_csv
-    if loaders_cfg.get("md", True):
-        loaders_map[".md"] = load_md
-    if loaders_cfg.get("rtf", False):
-        loaders_map[".rtf"] = load_rtf
-    if loaders_cfg.get("eml", False):
-        loaders_map[".eml"] = load_eml
-    if loaders_cfg.get("excel", False):
-        loaders_map.update({".xlsx": load_excel, ".xls": load_excel})
-    if loaders_cfg.get("images_ocr", False):
-        loaders_map.update({
-            ".png": load_image_ocr, ".jpg": load_image_ocr, ".jpeg": load_image_ocr, ".webp": load_image_ocr
-        })
-    if loaders_cfg.get("video", False):
-        loaders_map[".mp4"] = load_mp4
+    for name, (target, exts, default) in specs.items():
+        if not loaders_cfg.get(name, default):
+            continue
+        loader = LazyLoader(name, target, opts.get(name))
+        for ext in exts:
+            loaders_map.setdefault(ext, loader)
 
     return loaders_map
 
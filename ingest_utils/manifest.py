@@ -2,19 +2,21 @@ from pathlib import Path
 import json
 import hashlib
 
-MANIFEST_PATH = Path("chroma/.ingest_manifest.json")
+from vectordb.snapshots import manifest_path
 
-def load_manifest() -> dict:
-    if MANIFEST_PATH.exists():
+def load_manifest(path: Path | None = None) -> dict:
+    path = path or manifest_path("chroma")
+    if path.exists():
         try:
-            return json.load(open(MANIFEST_PATH, "r", encoding="utf-8"))
+            return json.load(open(path, "r", encoding="utf-8"))
         except Exception:
             return {}
     return {}
 
-def save_manifest(m: dict) -> None:
-    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
-    json.dump(m, open(MANIFEST_PATH, "w", encoding="utf-8"), ensure_ascii=False, indent=2)
+def save_manifest(m: dict, path: Path | None = None) -> None:
+    path = path or manifest_path("chroma")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    json.dump(m, open(path, "w", encoding="utf-8"), ensure_ascii=False, indent=2)
 
 def file_signature(p: Path) -> str:
     """Stable signature that changes on any content change.
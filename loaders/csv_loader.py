@@ -1,15 +1,67 @@
+import csv
 from pathlib import Path
-from typing import List
-from langchain_community.document_loaders import CSVLoader
+from typing import Iterable, List, Optional
 from langchain_core.documents import Document
 
-def load_csv(path: Path) -> List[Document]:
-    # CSVLoader turns each row into a Document with page_content as row text
-    loader = CSVLoader(str(path), encoding="utf-8")
-    docs = loader.load()
-    for idx, d in enumerate(docs):
-        d.metadata["type"] = "csv"
-        d.metadata["source"] = str(path)
-        d.metadata.setdefault("row", idx)
-        d.metadata["doc_name"] = path.name
+from loaders.text_encoding import detect_encoding, SAMPLE_BYTES
+
+LOADER_VERSION = 2
+
+MAX_CHARS = 2000
+
+
+def _dialect(sample: str):
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=",;\t|")
+    except csv.Error:
+        return csv.excel
+
+
+def load_csv(path: Path, max_chars: int = MAX_CHARS, skip_columns: Optional[Iterable[str]] = None) -> List[Document]:
+    """
+    Stream rows and pack them into Documents of up to `max_chars` characters
+    (one 'h: v | h: v' line per row). Encoding and dialect are sniffed once from
+    a bounded sample; only the current pack is buffered.
+    `skip_columns` names columns that are dropped from the text (not searchable).
+    Metadata carries `row_start`/`row_end` (0-based data rows).
+    """
+    encoding = detect_encoding(path)
+    skip = set(skip_columns or ())
+    docs: List[Document] = []
+
+    with open(path, "r", encoding=encoding, errors="replace", newline="") as f:
+        dialect = _dialect(f.read(SAMPLE_BYTES))
+        f.seek(0)
+        reader = csv.reader(f, dialect)
+        header = next(reader, None)
+        if header is None:
+            return []
+        keep = [(i, (h or f"col{i + 1}").strip()) for i, h in enumerate(header) if (h or "").strip() not in skip]
+
+        lines: List[str] = []
+        size = 0
+        start = 0
+
+        def flush(end: int) -> None:
+            docs.append(Document(
+                page_content="\n".join(lines),
+                metadata={
+                    "type": "csv", "source": str(path), "doc_name": path.name,
+                    "row_start": start, "row_end": end,
+                },
+            ))
+
+        for idx, row in enumerate(reader):
+            line = " | ".join(f"{h}: {row[i]}" for i, h in keep if i < len(row) and row[i].strip())
+            if not line:
+                continue
+            if lines and size + len(line) + 1 > max_chars:
+                flush(idx - 1)
+                lines, size, start = [], 0, idx
+            if not lines:
+                start = idx
+            lines.append(line)
+            size += len(line) + 1
+        if lines:
+            flush(idx)
     return docs
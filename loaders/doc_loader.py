@@ -1,13 +1,21 @@
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 import subprocess
 import tempfile
+import hashlib
 import shutil
 import os
 
 from langchain_community.document_loaders import Docx2txtLoader
 from langchain_core.documents import Document
 
+LOADER_VERSION = 2
+
+DOC_CACHE_DIR = Path(os.getenv("DOC_CACHE_DIR", "cache/doc2docx"))
+FILES_PER_CALL = 200          # one soffice start-up per this many files
+SECONDS_PER_FILE = 60         # conversion timeout budget per file in a call
+
 def _get_soffice_cmd() -> str:
     """
     Resolve soffice executable. You can set LIBREOFFICE_PATH env var to the full exe path.
@@ -18,50 +26,118 @@ def _get_soffice_cmd() -> str:
         return env_path
     return "soffice"
 
-def _convert_doc_to_docx(src: Path, out_dir: Path) -> Path:
+def _content_hash(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _cached_docx(digest: str) -> Path:
+    return DOC_CACHE_DIR / digest[:2] / f"{digest}.docx"
+
+def _convert_many(sources: Dict[str, Path], profile_dir: Path) -> None:
+    """
+    Convert {digest: .doc path} to cached .docx files with ONE soffice call.
+    Inputs are staged as <digest>.doc so equal file names from different folders
+    can't collide. `profile_dir` is this worker's own LibreOffice user profile;
+    LO locks its profile, so concurrent calls each need a separate one.
+    """
+    with tempfile.TemporaryDirectory(prefix="doc2docx_") as tmp:
+        stage, out_dir = Path(tmp) / "in", Path(tmp) / "out"
+        stage.mkdir()
+        for digest, src in sources.items():
+            staged = stage / f"{digest}.doc"
+            try:
+                os.symlink(src.resolve(), staged)
+            except OSError:
+                shutil.copy2(src, staged)
+        cmd = [
+            _get_soffice_cmd(),
+            f"-env:UserInstallation={profile_dir.resolve().as_uri()}",
+            "--headless",
+            "--convert-to", "docx",   # don't specify a filter; LO picks correct one
+            "--outdir", str(out_dir),
+            *(str(p) for p in sorted(stage.iterdir())),
+        ]
+        # Capture output to prevent noisy stdout/stderr in logs
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=SECONDS_PER_FILE * len(sources))
+        for digest in sources:
+            out_docx = out_dir / f"{digest}.docx"
+            if out_docx.exists():
+                target = _cached_docx(digest)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(out_docx), target)
+        if proc.returncode != 0:
+            print(f"⚠️ LibreOffice exited with {proc.returncode} for a batch of {len(sources)} files:\n{proc.stderr.strip()}")
+
+def _convert_doc_to_docx(src: Path) -> Path:
     """
-    Convert legacy .doc to .docx using LibreOffice (soffice) in headless mode.
-    Returns the path to the converted .docx.
+    Return the cached .docx for a legacy .doc, converting it with LibreOffice
+    (soffice, headless) if this content was never converted before.
     Raises RuntimeError if conversion fails or output file is missing.
     """
-    out_dir.mkdir(parents=True, exist_ok=True)
-    soffice = _get_soffice_cmd()
-    cmd = [
-        soffice,
-        "--headless",
-        "--convert-to", "docx",   # don't specify a filter; LO picks correct one
-        str(src),
-        "--outdir", str(out_dir),
-    ]
-    # Capture output to prevent noisy stdout/stderr in logs
-    proc = subprocess.run(cmd, capture_output=True, text=True)
-    # LibreOffice returns 0 on success; but we also verify the file physically exists
-    out_docx = out_dir / (src.stem + ".docx")
-    if proc.returncode != 0 or not out_docx.exists():
-        raise RuntimeError(
-            "LibreOffice conversion failed.\n"
-            f"Command: {' '.join(cmd)}\n"
-            f"Exit code: {proc.returncode}\n"
-            f"stdout:\n{proc.stdout}\n"
-            f"stderr:\n{proc.stderr}"
-        )
+    digest = _content_hash(src)
+    out_docx = _cached_docx(digest)
+    if out_docx.exists():
+        return out_docx
+    with tempfile.TemporaryDirectory(prefix="lo_profile_") as profile:
+        _convert_many({digest: src}, Path(profile))
+    if not out_docx.exists():
+        raise RuntimeError(f"LibreOffice conversion failed for {src} (soffice: {_get_soffice_cmd()})")
     return out_docx
 
+def _docs_from_docx(path: Path, out_docx: Path) -> List[Document]:
+    docs = Docx2txtLoader(str(out_docx)).load()
+    for d in docs:
+        d.metadata.update({
+            "type": "doc",
+            "source": str(path),     # keep original .doc as source
+            "doc_name": path.name,
+            "converted_from": str(out_docx),
+        })
+    return docs
+
 def load_doc(path: Path) -> List[Document]:
     """
-    Convert .doc -> .docx, then load via Docx2txtLoader.
+    Convert .doc -> .docx (cached by content hash), then load via Docx2txtLoader.
+    """
+    return _docs_from_docx(path, _convert_doc_to_docx(path))
+
+def load_doc_batch(paths: List[Path], workers: Optional[int] = None) -> Dict[Path, List[Document]]:
+    """
+    Convert many .doc files with a few soffice calls (FILES_PER_CALL each),
+    running up to `workers` calls concurrently on separate user profiles.
+    Files that failed to convert are left out, so ingest retries them one by one.
     """
-    tmpdir = Path(tempfile.mkdtemp(prefix="doc2docx_"))
-    try:
-        out_docx = _convert_doc_to_docx(path, tmpdir)
-        docs = Docx2txtLoader(str(out_docx)).load()
-        for d in docs:
-            d.metadata.update({
-                "type": "doc",
-                "source": str(path),     # keep original .doc as source
-                "doc_name": path.name,
-                "converted_from": str(out_docx),
-            })
-        return docs
-    finally:
-        shutil.rmtree(tmpdir, ignore_errors=True)
+    digests = {p: _content_hash(p) for p in paths}
+    missing: Dict[str, Path] = {}
+    for p, digest in digests.items():
+        if not _cached_docx(digest).exists():
+            missing.setdefault(digest, p)  # identical copies are converted once
+
+    if missing:
+        items = list(missing.items())
+        workers = min(workers or max(1, (os.cpu_count() or 1) // 2), len(items))
+        size = min(FILES_PER_CALL, -(-len(items) // workers))  # small sets still use every worker
+        batches = [dict(items[i:i + size]) for i in range(0, len(items), size)]
+        with tempfile.TemporaryDirectory(prefix="lo_profiles_") as profiles:
+            def run(w: int):
+                # worker w owns profile w and converts every w-th batch sequentially
+                for batch in batches[w::workers]:
+                    try:
+                        _convert_many(batch, Path(profiles) / f"worker{w}")
+                    except Exception as e:
+                        print(f"⚠️ LibreOffice batch failed ({len(batch)} files): {e}")
+            # threads are enough: the work happens in the soffice processes
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                list(ex.map(run, range(workers)))
+        print(f"📄 Converted {sum(_cached_docx(d).exists() for d in missing)}/{len(missing)} .doc files in {len(batches)} LibreOffice call(s)")
+
+    out: Dict[Path, List[Document]] = {}
+    for p, digest in digests.items():
+        if _cached_docx(digest).exists():
+            out[p] = _docs_from_docx(p, _cached_docx(digest))
+    return out
+
+load_doc.batch = load_doc_batch
@@ -3,6 +3,8 @@ from typing import List
 from langchain_community.document_loaders import UnstructuredWordDocumentLoader
 from langchain_core.documents import Document
 
+LOADER_VERSION = 1
+
 def load_docx(path: Path) -> List[Document]:
     # mode="elements" returns many smaller Documents (titles, paragraphs, lists)
     loader = UnstructuredWordDocumentLoader(str(path), mode="elements")
@@ -1,19 +1,80 @@
+from itertools import islice
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Sequence, Tuple
 import pandas as pd
 from langchain_core.documents import Document
 
-def load_excel(path: Path) -> List[Document]:
-    docs: List[Document] = []
+LOADER_VERSION = 2
+
+ROWS_PER_DOC = 25
+RENDER_BATCH = 5000  # rows rendered per vectorised pass; bounds memory on huge sheets
+
+
+def _blank(v) -> bool:
+    return v is None or (isinstance(v, float) and pd.isna(v)) or (isinstance(v, str) and not v.strip())
+
+
+def _labels(header: Sequence) -> List[str]:
+    return [f"col{i + 1}" if _blank(h) else str(h).strip() for i, h in enumerate(header)]
+
+
+def _render_rows(labels: List[str], block: pd.DataFrame) -> pd.Series:
+    """'h: v | h: v' per row, built column-wise instead of df.iterrows(); '' for blank rows."""
+    block = block.astype(str)
+    blank = ~block.apply(lambda c: c.str.strip() != "").any(axis=1)
+    cols = [labels[i] + ": " + block.iloc[:, i] for i in range(min(len(labels), block.shape[1]))]
+    rows = cols[0].str.cat(cols[1:], sep=" | ") if len(cols) > 1 else cols[0]
+    return rows.mask(blank, "")
+
+
+def _xlsx_sheets(path: Path) -> Iterator[Tuple[str, Iterator[tuple]]]:
+    # read_only streams rows from the zip instead of building the whole workbook
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            yield ws.title, ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _xls_sheets(path: Path) -> Iterator[Tuple[str, Iterator[tuple]]]:
+    # legacy .xls has no streaming reader; one sheet at a time is the best we get
     xls = pd.ExcelFile(path)
     for sheet in xls.sheet_names:
-        df = xls.parse(sheet).fillna("")
-        headers = list(df.columns)
-        for idx, row in df.iterrows():
-            row_txt = " | ".join(f"{h}: {row[h]}" for h in headers)
-            content = f"[SHEET] {sheet}\n{row_txt}"
-            docs.append(Document(
-                page_content=content,
-                metadata={"type":"excel","source":str(path),"doc_name":path.name,"sheet":sheet,"row":int(idx)}
-            ))
+        df = xls.parse(sheet, header=None)
+        yield sheet, df.itertuples(index=False, name=None)
+
+
+def load_excel(path: Path, rows_per_doc: int = ROWS_PER_DOC) -> List[Document]:
+    """
+    One Document per `rows_per_doc` rows. Each keeps the sheet name and header
+    labels in its text and `sheet`/`row_start`/`row_end` (0-based data rows) in metadata.
+    For .xlsx at most RENDER_BATCH rows are held as a DataFrame at a time.
+    """
+    docs: List[Document] = []
+    sheets = _xls_sheets(path) if path.suffix.lower() == ".xls" else _xlsx_sheets(path)
+    for sheet, rows in sheets:
+        header = next((r for r in rows if not all(_blank(v) for v in r)), None)
+        if header is None:
+            continue
+        labels = _labels(header)
+        row0 = 0
+        while True:
+            raw = list(islice(rows, RENDER_BATCH))
+            if not raw:
+                break
+            rendered = _render_rows(labels, pd.DataFrame(raw, dtype=object).fillna("")).tolist()
+            for i in range(0, len(rendered), rows_per_doc):
+                lines = [r for r in rendered[i:i + rows_per_doc] if r]
+                if not lines:
+                    continue
+                docs.append(Document(
+                    page_content=f"[SHEET] {sheet}\n" + "\n".join(lines),
+                    metadata={
+                        "type": "excel", "source": str(path), "doc_name": path.name, "sheet": sheet,
+                        "row_start": row0 + i, "row_end": row0 + min(i + rows_per_doc, len(rendered)) - 1,
+                    },
+                ))
+            row0 += len(raw)
     return docs
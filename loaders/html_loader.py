@@ -3,6 +3,8 @@ from typing import List
 from langchain_community.document_loaders import UnstructuredHTMLLoader
 from langchain_core.documents import Document
 
+LOADER_VERSION = 1
+
 def load_html(path: Path) -> List[Document]:
     loader = UnstructuredHTMLLoader(str(path))
     docs = loader.load()
@@ -1,23 +1,118 @@
+import os
+import gzip
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List
-from PIL import Image
+from typing import Dict, List, Optional
+from PIL import Image, ImageFilter, ImageOps, ImageStat
 import pytesseract
 from langchain_core.documents import Document
 
-def load_image_ocr(path: Path) -> List[Document]:
+LOADER_VERSION = 3
+
+OCR_LANG = "deu+eng"
+OCR_CACHE_DIR = Path(os.getenv("OCR_CACHE_DIR", "cache/ocr"))
+MAX_SIDE = 2000            # ~300 dpi for A4; larger scans only slow tesseract down
+# Pre-OCR gate, only for near-uniform images. Sample set (data/): thumbnail stddev
+# 11-80 (handwritten scan 10.99), edge ratio 0.04-0.21; blank pages sit near 0.
+MIN_STDDEV = 3.0
+MIN_EDGE_RATIO = 0.004     # share of edge pixels text needs at thumbnail size
+
+
+def _content_hash(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_file(digest: str) -> Path:
+    # preprocessing/lang are part of the key: changing them must not reuse old text
+    return OCR_CACHE_DIR / digest[:2] / f"{digest}.v{LOADER_VERSION}.{OCR_LANG}.txt.gz"
+
+
+def _cached_text(digest: str) -> Optional[str]:
+    p = _cache_file(digest)
+    if not p.exists():
+        return None
     try:
-        img = Image.open(path)
-        # Use German+English; if 'deu' missing, this will fail visibly
-        txt = pytesseract.image_to_string(img, lang="deu+eng")
-    except Exception as e:
-        print(f"⚠️ OCR failed for {path.name}: {e}")
-        return []  # <-- do NOT store failure text in the DB
+        with gzip.open(p, "rt", encoding="utf-8") as f:
+            return f.read()
+    except Exception:
+        return None
+
+
+def _store_text(digest: str, text: str) -> None:
+    p = _cache_file(digest)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        f.write(text)
+    tmp.replace(p)
+
+
+def _otsu_threshold(gray: Image.Image) -> int:
+    hist = gray.histogram()[:256]
+    total = sum(hist)
+    sum_all = sum(i * h for i, h in enumerate(hist))
+    w_b = sum_b = 0
+    best, threshold = 0.0, 127
+    for t, h in enumerate(hist):
+        w_b += h
+        if w_b == 0:
+            continue
+        w_f = total - w_b
+        if w_f == 0:
+            break
+        sum_b += t * h
+        m_b, m_f = sum_b / w_b, (sum_all - sum_b) / w_f
+        between = w_b * w_f * (m_b - m_f) ** 2
+        if between > best:
+            best, threshold = between, t
+    return threshold
+
+
+def _likely_has_text(gray: Image.Image) -> bool:
+    """Cheap pre-check on a thumbnail: uniform or edge-free images carry no text."""
+    thumb = gray.copy()
+    thumb.thumbnail((256, 256))
+    if ImageStat.Stat(thumb).stddev[0] < MIN_STDDEV:
+        return False
+    edges = thumb.filter(ImageFilter.FIND_EDGES).point(lambda p: 255 if p > 64 else 0)
+    return ImageStat.Stat(edges).mean[0] / 255 >= MIN_EDGE_RATIO
+
+
+def _preprocess(gray: Image.Image) -> Image.Image:
+    """Downscale and binarise (Otsu) before handing the image to tesseract."""
+    if max(gray.size) > MAX_SIDE:
+        gray.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+    t = _otsu_threshold(gray)
+    return gray.point(lambda p: 255 if p > t else 0, mode="1")
+
 
+def _ocr_text(path: Path) -> str:
+    """OCR one image via the content-hash cache. Raises on unreadable images/tesseract errors.
+    Only real tesseract output is cached; a skip by the pre-check is not."""
+    digest = _content_hash(path)
+    cached = _cached_text(digest)
+    if cached is not None:
+        return cached
+    with Image.open(path) as img:
+        gray = ImageOps.exif_transpose(img).convert("L")
+        if not _likely_has_text(gray):
+            return ""
+        # Use German+English; if 'deu' missing, this will fail visibly
+        txt = pytesseract.image_to_string(_preprocess(gray), lang=OCR_LANG)
     txt = (txt or "").strip()
+    _store_text(digest, txt)
+    return txt
+
+
+def _to_docs(path: Path, txt: str) -> List[Document]:
     if not txt:
         print(f"ℹ️ OCR found no text in {path.name}; skipping.")
         return []
-
     return [Document(
         page_content=f"[DOC_NAME: {path.name}]\n{txt}",
         metadata={
@@ -26,3 +121,43 @@ def load_image_ocr(path: Path) -> List[Document]:
             "source": str(path),
         },
     )]
+
+
+def load_image_ocr(path: Path) -> List[Document]:
+    try:
+        txt = _ocr_text(path)
+    except Exception as e:
+        print(f"⚠️ OCR failed for {path.name}: {e}")
+        return []  # <-- do NOT store failure text in the DB
+    return _to_docs(path, txt)
+
+
+def _ocr_worker(path: Path):
+    try:
+        return path, _ocr_text(path), None
+    except Exception as e:
+        return path, None, e
+
+
+def _init_worker():
+    # one tesseract per core; stop each one from spawning its own OpenMP threads
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def load_image_ocr_batch(paths: List[Path], workers: Optional[int] = None) -> Dict[Path, List[Document]]:
+    """OCR many images on a bounded process pool (one worker per core).
+    Failed images are left out, so the caller retries them with the per-file loader."""
+    out: Dict[Path, List[Document]] = {}
+    if not paths:
+        return out
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths)), initializer=_init_worker) as ex:
+        for path, txt, err in ex.map(_ocr_worker, paths, chunksize=4):
+            if err is not None:
+                print(f"⚠️ OCR failed for {path.name}: {err}")
+            else:
+                out[path] = _to_docs(path, txt)
+    return out
+
+
+load_image_ocr.batch = load_image_ocr_batch
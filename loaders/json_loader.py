@@ -1,37 +1,218 @@
 import json
 from pathlib import Path
-from typing import List
+from typing import Any, Iterator, List, Tuple
 from langchain_core.documents import Document
 
-def load_json(path: Path) -> List[Document]:
+LOADER_VERSION = 4
+
+MAX_CHARS = 2000
+JSONL_SUFFIXES = {".jsonl", ".ndjson"}
+_VALUE_EVENTS = {"null", "boolean", "integer", "double", "number", "string", "start_map", "start_array"}
+
+
+def _child_path(path: str, key) -> str:
+    if isinstance(key, int):
+        return f"{path}[{key}]"
+    if key.isidentifier():
+        return f"{path}.{key}"
+    return f"{path}[{json.dumps(key, ensure_ascii=False)}]"
+
+
+def _render(value: Any) -> str:
+    return json.dumps(value, indent=2, ensure_ascii=False, default=str)
+
+
+class _FieldGroups:
     """
-    Load a JSON file and convert it into a Document.
+    Non-array fields of a top-level object, packed together as they arrive into
+    records of at most max_chars (one field rendered at a time). A field that is
+    longer on its own is a record of its own (split further by _split).
     """
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.group: dict = {}
+        self.size = 0
+
+    def add(self, key: str, value: Any) -> Iterator[Tuple[str, Any]]:
+        n = len(_render(value)) + len(key) + 8
+        if n > self.max_chars:
+            yield _child_path("$", key), value
+            return
+        if self.group and self.size + n > self.max_chars:
+            yield from self.flush()
+        self.group[key] = value
+        self.size += n
+
+    def flush(self) -> Iterator[Tuple[str, Any]]:
+        if self.group:
+            key = next(iter(self.group))
+            yield ("$" if len(self.group) > 1 else _child_path("$", key)), self.group
+        self.group, self.size = {}, 0
+
+
+def _records_in_memory(data: Any, max_chars: int = MAX_CHARS) -> Iterator[Tuple[str, Any]]:
+    """Same record rule as _records_streaming, for an already parsed document."""
+    if isinstance(data, list):
+        for i, v in enumerate(data):
+            yield f"$[{i}]", v
+    elif isinstance(data, dict):
+        fields = _FieldGroups(max_chars)
+        for k, v in data.items():
+            if isinstance(v, list):
+                for i, item in enumerate(v):
+                    yield f"{_child_path('$', k)}[{i}]", item
+            else:
+                yield from fields.add(k, v)
+        yield from fields.flush()
+    else:
+        yield "$", data
+
+
+def _records_streaming(f, max_chars: int = MAX_CHARS) -> Iterator[Tuple[str, Any]]:
+    """
+    (json_path, value) per record, holding one record in memory at a time.
+    Records are the items of a top-level array and the items of arrays directly
+    under a top-level object ({"data": [...]}). The other fields of a top-level
+    object are packed together (_FieldGroups) up to max_chars, so a config- or
+    record-shaped object keeps its context while memory stays bounded by one field.
+    """
+    import ijson
+    from ijson.common import ObjectBuilder
+
+    events = ijson.parse(f, use_float=True)
+    stack: List[list] = []  # open containers: [kind, path, key-or-next-index]
+    fields = _FieldGroups(max_chars)   # non-array fields of a top-level object
+    for _prefix, event, value in events:
+        if event == "map_key":
+            stack[-1][2] = value
+            continue
+        if event in ("end_map", "end_array"):
+            stack.pop()
+            continue
+        if event not in _VALUE_EVENTS:
+            continue
+
+        if not stack:
+            path = "$"
+        else:
+            kind, parent, key = stack[-1]
+            path = _child_path(parent, key)
+            if kind == "array":
+                stack[-1][2] += 1
+        kinds = [c[0] for c in stack]
+        is_record = (
+            kinds == ["array"]
+            or (kinds == ["map"] and event != "start_array")
+            or kinds == ["map", "array"]
+            or (not stack and event not in ("start_map", "start_array"))
+        )
+        if not is_record:
+            stack.append(["array" if event == "start_array" else "map", path, 0 if event == "start_array" else None])
+            continue
+
+        builder = ObjectBuilder()
+        builder.event(event, value)
+        depth = 1 if event in ("start_map", "start_array") else 0
+        while depth:
+            _prefix, event, value = next(events)
+            builder.event(event, value)
+            if event in ("start_map", "start_array"):
+                depth += 1
+            elif event in ("end_map", "end_array"):
+                depth -= 1
+        if kinds == ["map"]:
+            yield from fields.add(stack[-1][2], builder.value)
+        else:
+            yield path, builder.value
+    yield from fields.flush()
+
+
+def _records_jsonl(path: Path) -> Iterator[Tuple[str, Any]]:
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            try:
+                yield f"$[{i}]", json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"⚠️ {path.name}: skipping invalid JSON on line {i + 1}: {e}")
+
+
+def _split(path: str, value: Any, max_chars: int) -> Iterator[Tuple[str, str]]:
+    """
+    One (json_path, text) per record; a record over max_chars is split into its
+    subtrees, packing small siblings together (lists as `path[i:j]`).
+    """
+    text = _render(value)
+    if len(text) <= max_chars or not isinstance(value, (dict, list)) or not value:
+        yield path, text
+        return
+
+    is_dict = isinstance(value, dict)
+    items = list(value.items()) if is_dict else list(enumerate(value))
+    group: list = []
+    size = 0
+
+    def flush():
+        if is_dict:
+            # a lone field gets its own path, so split parts of one object stay apart
+            return (_child_path(path, group[0][0]) if len(group) == 1 else path), _render(dict(group))
+        first, last = group[0][0], group[-1][0]
+        return f"{path}[{first}:{last + 1}]", _render([v for _, v in group])
+
+    for key, child in items:
+        child_text = _render(child)
+        if len(child_text) > max_chars and isinstance(child, (dict, list)) and child:
+            if group:
+                yield flush()
+                group, size = [], 0
+            yield from _split(_child_path(path, key), child, max_chars)
+            continue
+        if group and size + len(child_text) > max_chars:
+            yield flush()
+            group, size = [], 0
+        group.append((key, child))
+        size += len(child_text)
+    if group:
+        yield flush()
+
+
+def load_json(path: Path, max_chars: int = MAX_CHARS) -> List[Document]:
+    """
+    Stream a JSON/JSONL/NDJSON file into one Document per record (or per subtree
+    when a record exceeds max_chars), with the record's JSONPath in `json_path`.
+    Uses ijson when installed; otherwise plain JSON files are parsed in one go.
+    """
+    docs: List[Document] = []
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        # Convert JSON into a nice string (flatten nested objects)
-        text = json.dumps(data, indent=2, ensure_ascii=False)
-
-        return [
-            Document(
-                page_content=text,
-                metadata={
-                    "source": str(path),
-                    "doc_name": path.name,
-                    "type": "json"
-                }
-            )
-        ]
+        if path.suffix.lower() in JSONL_SUFFIXES:
+            records = _records_jsonl(path)
+            f = None
+        else:
+            f = open(path, "rb")
+            try:
+                import ijson  # noqa: F401
+                records = _records_streaming(f, max_chars)
+            except ImportError:
+                records = _records_in_memory(json.load(f), max_chars)
+
+        try:
+            for rec_path, value in records:
+                for json_path, text in _split(rec_path, value, max_chars):
+                    docs.append(Document(
+                        page_content=f"[JSON_PATH] {json_path}\n{text}",
+                        metadata={
+                            "source": str(path),
+                            "doc_name": path.name,
+                            "type": "json",
+                            "json_path": json_path,
+                        }
+                    ))
+        finally:
+            if f is not None:
+                f.close()
     except Exception as e:
-        return [
-            Document(
-                page_content=f"[ERROR loading JSON: {e}]",
-                metadata={
-                    "source": str(path),
-                    "doc_name": path.name,
-                    "type": "json"
-                }
-            )
-        ]
+        # keep what was parsed before the error; never store error text in the DB
+        print(f"⚠️ JSON parse error in {path.name} after {len(docs)} documents: {e}")
+    return docs
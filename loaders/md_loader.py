@@ -3,6 +3,8 @@ from typing import List
 from langchain_community.document_loaders import UnstructuredMarkdownLoader
 from langchain_core.documents import Document
 
+LOADER_VERSION = 1
+
 def load_md(path: Path) -> List[Document]:
     docs = UnstructuredMarkdownLoader(str(path)).load()
     for d in docs:
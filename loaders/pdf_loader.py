@@ -1,14 +1,57 @@
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List
-from langchain_community.document_loaders import PyPDFLoader
+from typing import Iterator, List, Optional
 from langchain_core.documents import Document
 
-def load_pdf(path: Path) -> List[Document]:
-    # One loader instance per file keeps page metadata intact
-    loader = PyPDFLoader(str(path))
-    docs = loader.load()
-    for d in docs:
-        d.metadata["type"] = "pdf"
-        d.metadata["source"] = str(path)
-        d.metadata["doc_name"] = path.name
-    return docs
+LOADER_VERSION = 2
+
+PARALLEL_MIN_PAGES = 64   # below this, process start-up costs more than it saves
+PAGES_PER_TASK = 32
+
+
+def page_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8", errors="ignore")).hexdigest()[:16]
+
+
+def iter_pdf_pages(path: Path, start: int = 0, stop: Optional[int] = None) -> Iterator[Document]:
+    """
+    Yield one Document per page in [start, stop), parsing pages only as they are consumed.
+    `page` is 0-based (same as PyPDFLoader); `page_hash` fingerprints the extracted text
+    so ingest can re-embed only pages that changed.
+    """
+    from pypdf import PdfReader
+    reader = PdfReader(str(path))
+    total = len(reader.pages)
+    for i in range(start, min(stop if stop is not None else total, total)):
+        text = reader.pages[i].extract_text() or ""
+        yield Document(
+            page_content=text,
+            metadata={
+                "type": "pdf",
+                "source": str(path),
+                "doc_name": path.name,
+                "page": i,
+                "total_pages": total,
+                "page_hash": page_hash(text),
+            },
+        )
+
+
+def _extract_range(args) -> List[Document]:
+    path, start, stop = args
+    return list(iter_pdf_pages(path, start, stop))
+
+
+def load_pdf(path: Path, workers: Optional[int] = None) -> List[Document]:
+    from pypdf import PdfReader
+    total = len(PdfReader(str(path)).pages)
+    workers = workers or min(os.cpu_count() or 1, max(1, total // PAGES_PER_TASK))
+    if total < PARALLEL_MIN_PAGES or workers <= 1:
+        return list(iter_pdf_pages(path))
+
+    # Large manuals: split by page range; each worker opens the file itself.
+    ranges = [(path, s, s + PAGES_PER_TASK) for s in range(0, total, PAGES_PER_TASK)]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return [d for part in ex.map(_extract_range, ranges) for d in part]
@@ -3,6 +3,8 @@ from typing import List
 from langchain_community.document_loaders import UnstructuredPowerPointLoader
 from langchain_core.documents import Document
 
+LOADER_VERSION = 1
+
 def load_pptx(path: Path) -> List[Document]:
     loader = UnstructuredPowerPointLoader(str(path))
     docs = loader.load()
@@ -3,6 +3,8 @@ from typing import List
 from langchain_community.document_loaders import UnstructuredRTFLoader
 from langchain_core.documents import Document
 
+LOADER_VERSION = 1
+
 def load_rtf(path: Path) -> List[Document]:
     docs = UnstructuredRTFLoader(str(path)).load()
     for d in docs:
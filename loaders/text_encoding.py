@@ -0,0 +1,30 @@
+from pathlib import Path
+import codecs
+
+SAMPLE_BYTES = 64 * 1024
+CANDIDATES = ("utf-8", "cp1252", "latin-1")
+
+
+def sniff_encoding(sample: bytes) -> str:
+    """
+    Pick an encoding from a bounded sample instead of decoding the whole file per guess.
+    BOMs win; otherwise the first candidate that decodes the sample cleanly
+    (a multi-byte sequence cut at the sample end is not an error).
+    latin-1 decodes anything, so this always returns something.
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    for enc in CANDIDATES:
+        try:
+            codecs.getincrementaldecoder(enc)(errors="strict").decode(sample, final=False)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    return "latin-1"
+
+
+def detect_encoding(path: Path, sample_bytes: int = SAMPLE_BYTES) -> str:
+    with open(path, "rb") as f:
+        return sniff_encoding(f.read(sample_bytes))
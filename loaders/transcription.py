@@ -0,0 +1,181 @@
+"""
+Whisper transcription service shared by media loaders.
+
+- One WhisperModel per process (per worker process when running in parallel),
+  instead of one per file.
+- Long media is decoded once, cut into overlapping windows and transcribed on a
+  process pool; segments are stitched back with absolute start/end times.
+- Transcripts are cached by media content hash (TRANSCRIPT_CACHE_DIR), so a
+  renamed/copied recording is never transcribed twice.
+"""
+import os
+import gzip
+import json
+import atexit
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+TRANSCRIPT_VERSION = 1
+TRANSCRIPT_CACHE_DIR = Path(os.getenv("TRANSCRIPT_CACHE_DIR", "cache/transcripts"))
+SAMPLE_RATE = 16000          # faster-whisper decodes to 16 kHz mono
+
+DEFAULT_MODEL_SIZE = "tiny"
+DEFAULT_COMPUTE_TYPE = "int8"
+WINDOW_SECONDS = 600.0
+OVERLAP_SECONDS = 10.0
+
+Segment = Dict[str, float]   # {"start", "end", "text"}
+
+_model = None
+_model_key: Optional[Tuple[str, str, int]] = None
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_key: Optional[Tuple] = None
+
+
+# --- Model (one per process) ---
+
+def get_model(model_size: str = DEFAULT_MODEL_SIZE, compute_type: str = DEFAULT_COMPUTE_TYPE, cpu_threads: int = 0):
+    global _model, _model_key
+    key = (model_size, compute_type, cpu_threads)
+    if _model is None or _model_key != key:
+        from faster_whisper import WhisperModel
+        _model = WhisperModel(model_size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)  # downloads on first run
+        _model_key = key
+    return _model
+
+
+def _init_worker(model_size: str, compute_type: str, cpu_threads: int):
+    get_model(model_size, compute_type, cpu_threads)
+
+
+def _get_pool(workers: int, model_size: str, compute_type: str) -> ProcessPoolExecutor:
+    """Long-lived pool so worker models survive across files."""
+    global _pool, _pool_key
+    cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+    key = (workers, model_size, compute_type, cpu_threads)
+    if _pool is None or _pool_key != key:
+        shutdown_pool()
+        _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_size, compute_type, cpu_threads))
+        _pool_key = key
+    return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_key
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+    _pool, _pool_key = None, None
+
+
+atexit.register(shutdown_pool)
+
+
+# --- Cache ---
+
+def _content_hash(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_file(digest: str, model_size: str, compute_type: str) -> Path:
+    # compute_type changes the output too (int8 vs float32 weights)
+    return TRANSCRIPT_CACHE_DIR / digest[:2] / f"{digest}.{model_size}.{compute_type}.v{TRANSCRIPT_VERSION}.json.gz"
+
+
+def _cached_segments(p: Path) -> Optional[List[Segment]]:
+    if not p.exists():
+        return None
+    try:
+        with gzip.open(p, "rt", encoding="utf-8") as f:
+            return json.load(f)["segments"]
+    except Exception:
+        return None
+
+
+def _store_segments(p: Path, segments: List[Segment]) -> None:
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump({"segments": segments}, f, ensure_ascii=False)
+    tmp.replace(p)
+
+
+# --- Windows ---
+
+def plan_windows(duration: float, window: float, overlap: float) -> List[Tuple[float, float, float, float]]:
+    """
+    (start, end, keep_from, keep_to) per window. Neighbouring windows overlap by
+    `overlap` seconds; the keep range splits each overlap in the middle so every
+    segment is kept by exactly one window.
+    """
+    step = max(window - overlap, 1.0)
+    starts = [0.0]
+    while starts[-1] + window < duration:
+        starts.append(starts[-1] + step)
+    out = []
+    for i, s in enumerate(starts):
+        e = min(s + window, duration)
+        keep_from = 0.0 if i == 0 else s + overlap / 2
+        keep_to = duration if i == len(starts) - 1 else starts[i + 1] + overlap / 2
+        out.append((s, e, keep_from, keep_to))
+    return out
+
+
+def _transcribe_audio(model, audio, offset: float = 0.0) -> List[Segment]:
+    segments, _info = model.transcribe(audio)
+    return [
+        {"start": offset + float(s.start), "end": offset + float(s.end), "text": (s.text or "").strip()}
+        for s in segments
+    ]
+
+
+def _transcribe_window(args) -> List[Segment]:
+    audio, start, keep_from, keep_to = args
+    # _model was loaded by the pool initializer
+    return [
+        s for s in _transcribe_audio(_model, audio, start)
+        if keep_from <= (s["start"] + s["end"]) / 2 < keep_to
+    ]
+
+
+def transcribe(
+    path: Path,
+    model_size: str = DEFAULT_MODEL_SIZE,
+    compute_type: str = DEFAULT_COMPUTE_TYPE,
+    window_seconds: float = WINDOW_SECONDS,
+    overlap_seconds: float = OVERLAP_SECONDS,
+    workers: Optional[int] = None,
+) -> List[Segment]:
+    """
+    Segments with absolute start/end (seconds) for one media file.
+    Media that fits in one window is transcribed in-process.
+    """
+    cache = _cache_file(_content_hash(path), model_size, compute_type)
+    cached = _cached_segments(cache)
+    if cached is not None:
+        return cached
+
+    from faster_whisper import decode_audio
+    audio = decode_audio(str(path), sampling_rate=SAMPLE_RATE)
+    duration = len(audio) / SAMPLE_RATE
+    windows = plan_windows(duration, window_seconds, overlap_seconds)
+    workers = min(workers or os.cpu_count() or 1, len(windows))
+
+    if len(windows) < 2 or workers <= 1:
+        segments = _transcribe_audio(get_model(model_size, compute_type), audio)
+    else:
+        tasks = [
+            (audio[int(s * SAMPLE_RATE):int(e * SAMPLE_RATE)], s, keep_from, keep_to)
+            for s, e, keep_from, keep_to in windows
+        ]
+        pool = _get_pool(workers, model_size, compute_type)
+        segments = [seg for part in pool.map(_transcribe_window, tasks) for seg in part]
+
+    segments = [s for s in segments if s["text"]]
+    _store_segments(cache, segments)
+    return segments
@@ -1,47 +1,74 @@
+import codecs
+from pathlib import Path
+from typing import Iterator, List, Tuple
 from langchain_core.documents import Document
 
-def load_txt(path):
+from loaders.text_encoding import sniff_encoding, SAMPLE_BYTES
+
+LOADER_VERSION = 2
+
+SEGMENT_BYTES = 1024 * 1024   # one Document per ~1 MB, cut at a line break
+READ_BYTES = 256 * 1024
+
+
+def _codec(encoding: str, head: bytes) -> Tuple[str, int]:
+    """(BOM-less codec, BOM length) so byte offsets can be tracked exactly."""
+    if encoding == "utf-8-sig":
+        return "utf-8", len(codecs.BOM_UTF8)
+    if encoding == "utf-16":
+        return ("utf-16-le" if head.startswith(codecs.BOM_UTF16_LE) else "utf-16-be"), 2
+    return encoding, 0
+
+
+def _cut(buf: bytearray, limit: int, newline: bytes) -> int:
+    """Offset just after the last line break before `limit` (whole code units), else `limit`."""
+    unit = len(newline)
+    i = buf.rfind(newline, 0, limit)
+    while i > 0 and i % unit:
+        i = buf.rfind(newline, 0, i)
+    return i + unit if i > 0 else limit - limit % unit
+
+
+def iter_txt_segments(path: Path, segment_bytes: int = SEGMENT_BYTES) -> Iterator[Document]:
     """
-    Robust TXT loader:
-    - tries several common Windows encodings
-    - last resort: UTF-8 with errors='replace'
-    - trims only for emptiness check; preserves original content for DB
+    Yield the file as line-aligned segments of about `segment_bytes`, reading it once.
+    The encoding is sniffed from the first block; undecodable bytes become U+FFFD.
+    `byte_start`/`byte_end` are file offsets of each segment.
     """
-    tried = []
-    for enc in ("utf-8", "utf-8-sig", "cp1252", "latin-1"):
-        try:
-            raw = path.read_text(encoding=enc, errors="strict")
-            # consider content 'empty' if no visible characters at all
-            if raw and raw.strip():
-                return [Document(
-                    page_content=raw,
+    with open(path, "rb") as f:
+        head = f.read(max(SAMPLE_BYTES, READ_BYTES))
+        codec, bom = _codec(sniff_encoding(head), head)
+        newline = "\n".encode(codec)
+        decoder = codecs.getincrementaldecoder(codec)(errors="replace")
+        buf = bytearray(head[bom:])
+        pos = bom
+        eof = not head
+        while buf or not eof:
+            while len(buf) < segment_bytes and not eof:
+                block = f.read(READ_BYTES)
+                eof = not block
+                buf += block
+            cut = len(buf) if eof and len(buf) <= segment_bytes else _cut(buf, segment_bytes, newline)
+            text = decoder.decode(bytes(buf[:cut]), final=eof and cut == len(buf))
+            del buf[:cut]
+            # consider content 'empty' if no visible characters at all; keep original text otherwise
+            if text.strip():
+                yield Document(
+                    page_content=text,
                     metadata={
                         "source": str(path.resolve()),
                         "doc_name": path.name,
                         "type": "txt",
+                        "byte_start": pos,
+                        "byte_end": pos + cut,
                     },
-                )]
-            else:
-                # allow logging upstream that this file decoded but is empty
-                return []
-        except Exception as e:
-            tried.append(f"{enc}: {e.__class__.__name__}: {e}")
-
-    # last resort: decode with replacement to salvage something
-    try:
-        raw = path.read_text(encoding="utf-8", errors="replace")
-        if raw and raw.strip():
-            return [Document(
-                page_content=raw,
-                metadata={
-                    "source": str(path.resolve()),
-                    "doc_name": path.name,
-                    "type": "txt",
-                },
-            )]
-    except Exception:
-        pass
-
-    # Let ingest know we failed decoding
-    print(f"⚠️ TXT decode failed for {path.name}. Tried: {', '.join(tried)}")
-    return []
+                )
+            pos += cut
+
+
+def load_txt(path: Path, segment_bytes: int = SEGMENT_BYTES) -> List[Document]:
+    """
+    Text/log loader: one pass over the file, encoding sniffed from a bounded sample,
+    one Document per segment. Empty/whitespace-only files return [].
+    """
+    return list(iter_txt_segments(path, segment_bytes))
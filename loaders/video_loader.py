@@ -1,36 +1,43 @@
 from pathlib import Path
-from typing import List
-from faster_whisper import WhisperModel
+from typing import List, Optional
 from langchain_core.documents import Document
 
-def load_mp4(path: Path) -> List[Document]:
+from loaders.transcription import (
+    transcribe, DEFAULT_MODEL_SIZE, DEFAULT_COMPUTE_TYPE, WINDOW_SECONDS, OVERLAP_SECONDS,
+)
+
+LOADER_VERSION = 2
+
+def load_mp4(
+    path: Path,
+    model_size: str = DEFAULT_MODEL_SIZE,
+    compute_type: str = DEFAULT_COMPUTE_TYPE,
+    window_seconds: float = WINDOW_SECONDS,
+    overlap_seconds: float = OVERLAP_SECONDS,
+    workers: Optional[int] = None,
+) -> List[Document]:
     try:
-        from faster_whisper import WhisperModel
+        import faster_whisper  # noqa: F401
     except ImportError:
         print(f"⚠️ Skipping {path.name}: faster-whisper not installed")
         return []
 
-    model = WhisperModel("tiny")  # downloads on first run
-
     try:
-        segments, _info = model.transcribe(str(path))
+        segments = transcribe(path, model_size, compute_type, window_seconds, overlap_seconds, workers)
     except Exception as e:
         print(f"⚠️ Transcription failed for {path.name}: {e}")
         return []
 
     docs: List[Document] = []
     for seg in segments:
-        text = (seg.text or "").strip()
-        if not text:
-            continue
         docs.append(Document(
-            page_content=text,
+            page_content=seg["text"],
             metadata={
                 "type": "video",
                 "source": str(path),
                 "doc_name": path.name,
-                "start": float(seg.start),
-                "end": float(seg.end),
+                "start": float(seg["start"]),
+                "end": float(seg["end"]),
             }
         ))
     if not docs:
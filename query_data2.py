@@ -1,17 +1,26 @@
 # query_data2.py
 
 import os
+import json
+import time
 import argparse
-from typing import Dict, Any, List
-from langchain_chroma import Chroma
-from langchain.prompts import ChatPromptTemplate
-from langchain_ollama import OllamaEmbeddings
-from ollama import Client
+import httpx
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, wait
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_core.prompts import ChatPromptTemplate
+from embeddings.ollama_pool import get_pool
+from ingest_utils.ids import LOCATOR_KEYS
+from telemetry.metrics import QUERIES, Stopwatch
+from vectordb.chroma_client import get_shared_chroma
 
 # ---- Config (env overridable) ----
 CHROMA_PATH = os.getenv("CHROMA_PATH", "chroma")
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://h01.m5.jay-win.de:11434")
-EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+SNIPPET_CHARS = 300   # chars of each retrieved chunk shown in the output
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "180"))   # s, embed + generate incl. retries/queueing
 
 PROMPT_TEMPLATE = """
 You are a helpful assistant.
@@ -26,22 +35,20 @@ QUESTION:
 {question}
 """
 
-def get_embedding_function():
-    # Embeddings use the same Ollama host
-    return OllamaEmbeddings(model=EMBED_MODEL, base_url=OLLAMA_HOST)
+def _make_filter(file: str, typ: str) -> Dict[str, Any] | None:
+    clauses = []
+    if file:
+        clauses.append({"doc_name": file})
+    if typ:
+        clauses.append({"type": typ})
+    if len(clauses) > 1:
+        return {"$and": clauses}  # Chroma wants one operator per where-clause
+    return clauses[0] if clauses else None
 
-def _make_filter(args: argparse.Namespace) -> Dict[str, Any] | None:
-    filt: Dict[str, Any] = {}
-    if args.file:
-        filt["doc_name"] = args.file
-    if args.type:
-        filt["type"] = args.type
-    return filt or None
-
-def _client_side_filter(docs, args: argparse.Namespace):
+def _client_side_filter(docs, file: str, typ: str):
     # Extra safeguard in case server-side filter is too lax / unsupported
-    target = (args.file or "").strip()
-    typ = (args.type or "").strip()
+    target = (file or "").strip()
+    typ = (typ or "").strip()
     if not target and not typ:
         return docs
     out = []
@@ -58,62 +65,241 @@ def _client_side_filter(docs, args: argparse.Namespace):
             out.append(d)
     return out
 
-def query_rag(query_text: str, args: argparse.Namespace) -> str:
-    # Connect to Chroma
-    db = Chroma(persist_directory=CHROMA_PATH,
-                embedding_function=get_embedding_function())
-
-    # Build optional metadata filter
-    meta_filter = _make_filter(args)
-
+def _fetch_k(k: int, meta_filter) -> int:
     # Retrieve (fetch a bit more if filtering)
-    fetch_k = max(args.k, 5)
-    if meta_filter:
-        fetch_k = max(args.k * 3, 15)
-
-    docs = db.similarity_search(query_text, k=fetch_k, filter=meta_filter)
-    docs = _client_side_filter(docs, args)
-    docs = docs[:args.k]
-
-    if not docs:
-        print("Response: UNKNOWN")
-        return "UNKNOWN"
-
-    # Show retrieved chunks for logs/raw
-    print("---- Retrieved chunks ----")
-    for i, d in enumerate(docs, 1):
-        snippet = (d.page_content[:300] + "…") if len(d.page_content) > 300 else d.page_content
-        print(f"[{i}] {d.metadata.get('doc_name') or d.metadata.get('source')} -> {snippet}")
-    print("--------------------------")
-
-    # Build context & prompt
+    return max(k * 3, 15) if meta_filter else max(k, 5)
+
+def _prompt(query_text: str, docs) -> str:
     context = "\n\n---\n\n".join(d.page_content for d in docs)
     prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE).format(
         context=context, question=query_text
     )
-    user_prompt = str(prompt)
+    return str(prompt)
+
+# ---- Result types ----
+
+@dataclass
+class Source:
+    rank: int                      # 1-based, in prompt order
+    chunk_id: Optional[str]
+    doc_name: str
+    source: str
+    type: Optional[str]
+    locator: Dict[str, Any]        # page / slide / sheet / json_path / byte_start ... when known
+    distance: Optional[float]      # vector distance (lower = closer)
+    snippet: str                   # first SNIPPET_CHARS of the chunk
+
+@dataclass
+class QueryResult:
+    answer: str                    # "UNKNOWN" when there is no answer
+    sources: List[Source]
+    timings: Dict[str, float]      # ms per stage: embed, search, pack, generate, total
+    error: Optional[str] = None
+    docs: List[Document] = field(default_factory=list, repr=False)   # not serialised
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"answer": self.answer, "sources": [asdict(s) for s in self.sources],
+                "timings": self.timings, "error": self.error}
+
+    @property
+    def stdout(self) -> str:
+        """The text the CLI prints (retrieved chunks, "Response:", errors)."""
+        out: List[str] = []
+        emit = out.append
+        if self.sources:
+            # Show retrieved chunks for logs/raw
+            emit("---- Retrieved chunks ----")
+            for s in self.sources:
+                emit(f"[{s.rank}] {s.doc_name or s.source} -> {s.snippet}")
+            emit("--------------------------")
+        emit(f"Response: {self.answer}")
+        if self.error:
+            emit("Sources:")
+            emit(f"- ERROR: {self.error}")
+        return "\n".join(out) + "\n"
+
+def _source(rank: int, d: Document, distance: Optional[float]) -> Source:
+    md = d.metadata or {}
+    text = d.page_content or ""
+    return Source(
+        rank=rank,
+        chunk_id=md.get("id"),
+        doc_name=md.get("doc_name") or "",
+        source=md.get("source") or "",
+        type=md.get("type"),
+        locator={k: md[k] for k in LOCATOR_KEYS if md.get(k) not in (None, "", "none")},
+        distance=None if distance is None else round(float(distance), 4),
+        snippet=(text[:SNIPPET_CHARS] + "…") if len(text) > SNIPPET_CHARS else text,
+    )
+
+def _result(hits: List[Tuple[Document, Optional[float]]], timings: Dict[str, float],
+            answer: str = "", error: Exception | None = None) -> QueryResult:
+    if error is not None or not answer:
+        answer = "UNKNOWN"
+    return QueryResult(
+        answer=answer,
+        sources=[_source(i, d, dist) for i, (d, dist) in enumerate(hits, 1)],
+        timings={k: round(v, 1) for k, v in timings.items()},
+        error=f"{type(error).__name__}: {error}" if error is not None else None,
+        docs=[d for d, _ in hits],
+    )
 
-    # Chat client (same Ollama host as embeddings)
-    client = Client(host=OLLAMA_HOST)
+def _chat(model: str, user_prompt: str):
+    return get_pool(OLLAMA_HOST).achat(
+        model,
+        [{"role": "user", "content": user_prompt}],
+        options={"temperature": 0},
+    )
+
+def _remaining(deadline: float | None) -> float | None:
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("query deadline exceeded")
+    return left
+
+def _embed_query(db, text: str, deadline: float | None) -> List[float]:
+    emb = db.embeddings
+    if hasattr(emb, "pool"):  # PooledOllamaEmbeddings: bound the call by the deadline
+        return emb.pool.run(emb.pool.aembed(emb.model, [text]), timeout=_remaining(deadline))[0]
+    return emb.embed_query(text)
+
+def _hits_filter(hits, file: str, typ: str):
+    keep = {id(d) for d in _client_side_filter([d for d, _ in hits], file, typ)}
+    return [(d, dist) for d, dist in hits if id(d) in keep]
 
+def answer_query(
+    query_text: str,
+    k: int = 5,
+    model: str = "mistral",
+    file: str = "",
+    typ: str = "",
+    db=None,
+    timeout: float | None = QUERY_TIMEOUT,
+) -> QueryResult:
+    """
+    Retrieve + answer in-process. Embedding and chat go through the shared Ollama pool,
+    together bounded by `timeout` seconds. Timeouts (TimeoutError, httpx.TimeoutException)
+    propagate; other failures of the model call come back as result.error (answer "UNKNOWN").
+    """
+    # Active blue/green snapshot, one handle per process
+    db = db or get_shared_chroma(CHROMA_PATH)
+    clock = Stopwatch("query")
+    deadline = time.monotonic() + timeout if timeout else None
+
+    meta_filter = _make_filter(file, typ)
+    vector = _embed_query(db, query_text, deadline)
+    clock.lap("embed")
+    hits = db.similarity_search_by_vector_with_relevance_scores(vector, k=_fetch_k(k, meta_filter), filter=meta_filter)
+    hits = _hits_filter(hits, file, typ)[:k]
+    clock.lap("search")
+    if not hits:
+        QUERIES.inc(endpoint="query", outcome="no_hits")
+        return _result([], clock.done())
+
+    prompt = _prompt(query_text, [d for d, _ in hits])
+    clock.lap("pack")
     try:
-        resp = client.chat(
-            model=args.model,
-            messages=[{"role": "user", "content": user_prompt}],
-            options={"temperature": 0},
-            stream=False,
-        )
-        answer = (resp.get("message") or {}).get("content", "").strip()
+        answer = get_pool(OLLAMA_HOST).run(_chat(model, prompt), timeout=_remaining(deadline))
         if not answer:
             raise RuntimeError("Empty response from model")
+    except (TimeoutError, httpx.TimeoutException):
+        clock.lap("generate")
+        QUERIES.inc(endpoint="query", outcome="timeout")
+        raise
     except Exception as e:
-        print("Response: UNKNOWN")
-        print("Sources:")
-        print(f"- ERROR: {type(e).__name__}: {e}")
-        return "UNKNOWN"
+        clock.lap("generate")
+        QUERIES.inc(endpoint="query", outcome="error")
+        return _result(hits, clock.done(), error=e)
+    clock.lap("generate")
+    QUERIES.inc(endpoint="query", outcome="ok")
+    return _result(hits, clock.done(), answer)
 
-    print("Response:", answer)
-    return answer
+def answer_queries(items: List[Dict[str, Any]], db=None, window: int | None = None) -> Iterator[Tuple[int, QueryResult]]:
+    """
+    Answer many queries (dicts with query/k/model/file/type) together:
+    one batched embedding call, one Chroma query per distinct filter, and
+    generations pipelined through the pool (at most `window` in flight).
+    Yields (index, QueryResult) in completion order; embed/search timings are
+    for the whole batch, pack/generate are per query.
+    """
+    db = db or get_shared_chroma(CHROMA_PATH)
+    pool = get_pool(OLLAMA_HOST)
+    window = window or pool.lanes["generate"].limit
+    clock = Stopwatch("batch")
+
+    vectors = db.embeddings.embed_documents([it["query"] for it in items])
+    clock.lap("embed")
+
+    # --- vector searches, grouped by filter/fetch size ---
+    groups: Dict[tuple, List[int]] = defaultdict(list)
+    filters = {}
+    for i, it in enumerate(items):
+        meta_filter = _make_filter(it.get("file") or "", it.get("type") or "")
+        key = (json.dumps(meta_filter, sort_keys=True), _fetch_k(it.get("k", 5), meta_filter))
+        filters[key] = meta_filter
+        groups[key].append(i)
+    hits_by_index: Dict[int, list] = {}
+    for key, idxs in groups.items():
+        res = db._collection.query(
+            query_embeddings=[vectors[i] for i in idxs], n_results=key[1],
+            where=filters[key], include=["documents", "metadatas", "distances"],
+        )
+        for row, i in enumerate(idxs):
+            it = items[i]
+            hits = [(Document(page_content=text or "", metadata=md or {}), dist)
+                    for text, md, dist in zip(res["documents"][row], res["metadatas"][row], res["distances"][row])]
+            hits_by_index[i] = _hits_filter(hits, it.get("file") or "", it.get("type") or "")[:it.get("k", 5)]
+    clock.lap("search")
+    shared = dict(clock.ms)
+
+    # --- generations, completion order ---
+    pending: Dict[Any, Tuple[int, float, float]] = {}   # future -> (index, started, pack seconds)
+    try:
+        queue = iter(range(len(items)))
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < window:
+                i = next(queue, None)
+                if i is None:
+                    exhausted = True
+                    break
+                hits = hits_by_index[i]
+                if not hits:
+                    QUERIES.inc(endpoint="batch", outcome="no_hits")
+                    yield i, _result([], {**shared, "total": sum(shared.values())})
+                    continue
+                t0 = time.perf_counter()
+                prompt = _prompt(items[i]["query"], [d for d, _ in hits])
+                started = time.perf_counter()
+                pending[pool.spawn(_chat(items[i].get("model", "mistral"), prompt))] = (i, started, started - t0)
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                i, started, packed = pending.pop(fut)
+                item_clock = Stopwatch("batch")
+                item_clock.add("pack", packed)
+                item_clock.add("generate", time.perf_counter() - started)
+                timings = {**shared, **item_clock.ms}
+                timings["total"] = sum(timings.values())
+                try:
+                    answer = fut.result()
+                    result = (_result(hits_by_index[i], timings, answer) if answer
+                              else _result(hits_by_index[i], timings, error=RuntimeError("Empty response from model")))
+                except Exception as e:
+                    result = _result(hits_by_index[i], timings, error=e)
+                QUERIES.inc(endpoint="batch", outcome="error" if result.error else "ok")
+                yield i, result
+    finally:
+        for fut in pending:  # consumer went away: don't keep generating for it
+            fut.cancel()
+
+def query_rag(query_text: str, args: argparse.Namespace) -> str:
+    result = answer_query(query_text, k=args.k, model=args.model, file=args.file, typ=args.type)
+    print(result.stdout, end="")
+    return result.answer
 
 def main():
     parser = argparse.ArgumentParser()
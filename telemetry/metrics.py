@@ -0,0 +1,207 @@
+# telemetry/metrics.py
+"""
+In-process counters and latency histograms, rendered in Prometheus text format.
+
+    STAGE_SECONDS.observe(0.12, pipeline="query", stage="embed")
+    with timed(STAGE_SECONDS, pipeline="ingest", stage="chunk"): ...
+    clock = Stopwatch("query"); ...; clock.lap("search"); clock.done() -> {"search": ms, ..., "total": ms}
+    register_collector(fn)   # fn() -> lines, called only on scrape (queue depths etc.)
+    render()                 # text for GET /metrics
+
+Recording is a perf_counter, a bisect and a dict update under a lock; gauges
+that need to walk other state (Ollama lanes, admission queue) are collected only
+when /metrics is scraped. METRICS=0 turns recording off entirely (timings in
+responses still work).
+
+Each process has its own registry (one per uvicorn worker). The ingest
+subprocess writes its registry to INGEST_METRICS_FILE when it finishes and the
+API appends that file to /metrics (node-exporter textfile style).
+"""
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+ENABLED = os.getenv("METRICS", "1").strip().lower() not in ("0", "false", "no", "off")
+INGEST_METRICS_FILE = Path(os.getenv("INGEST_METRICS_FILE", "cache/ingest_metrics.prom"))
+# seconds; query stages are ms..s, Ollama generation and OCR loaders up to minutes
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        if not ENABLED:
+            return
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def lines(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        out += [f"{self.name}{_fmt_labels(k)} {_num(v)}" for k, v in items]
+        return out
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = BUCKETS):
+        self.name, self.help, self.buckets = name, help, buckets
+        self._series: Dict[LabelKey, list] = {}   # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, **labels):
+        if not ENABLED:
+            return
+        key = _key(labels)
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += seconds
+            s[-1] += 1
+
+    def lines(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(s)) for k, s in self._series.items())
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, s in items:
+            cum = 0
+            for bound, n in zip(self.buckets, s):
+                cum += n
+                out.append(f"{self.name}_bucket{_fmt_labels(key, ('le', _num(bound)))} {cum}")
+            out.append(f"{self.name}_bucket{_fmt_labels(key, ('le', '+Inf'))} {s[-1]}")
+            out.append(f"{self.name}_sum{_fmt_labels(key)} {s[-2]:.6f}")
+            out.append(f"{self.name}_count{_fmt_labels(key)} {s[-1]}")
+        return out
+
+
+# --- Metrics ---
+
+STAGE_SECONDS = Histogram(
+    "opal_stage_seconds",
+    "Time per pipeline stage (query: embed/search/pack/generate/db_write; ingest: load/chunk/embed/upsert).",
+)
+LOAD_SECONDS = Histogram("opal_loader_seconds", "Extraction time per file by loader (cache misses only).")
+CACHE_REQUESTS = Counter("opal_cache_requests_total", "Cache lookups by cache and result (hit/miss).")
+QUERIES = Counter("opal_queries_total", "Answered queries by endpoint and outcome.")
+
+_METRICS = [STAGE_SECONDS, LOAD_SECONDS, CACHE_REQUESTS, QUERIES]
+_collectors: List[Callable[[], Iterable[str]]] = []
+
+
+def register_collector(fn: Callable[[], Iterable[str]]) -> None:
+    """fn() returns exposition lines; it runs on every scrape and nowhere else."""
+    _collectors.append(fn)
+
+
+def gauge_lines(name: str, help: str, samples: Iterable[Tuple[Dict[str, object], float]],
+                kind: str = "gauge") -> List[str]:
+    """Exposition lines for values read at scrape time."""
+    out = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    out += [f"{name}{_fmt_labels(_key(labels))} {_num(v)}" for labels, v in samples]
+    return out
+
+
+def render(extra_files: Iterable[Path] = ()) -> str:
+    lines: List[str] = []
+    for m in _METRICS:
+        lines += m.lines()
+    for fn in _collectors:
+        try:
+            lines += list(fn())
+        except Exception as e:  # one broken collector must not break the scrape
+            lines.append(f"# collector {getattr(fn, '__name__', fn)} failed: {type(e).__name__}")
+    for path in extra_files:
+        try:
+            lines.append(Path(path).read_text(encoding="utf-8").rstrip("\n"))
+        except OSError:
+            pass
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: Path = INGEST_METRICS_FILE) -> None:
+    """Dump this process's registry (ingest runs in a subprocess of the API)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    lines: List[str] = []
+    for m in _METRICS:
+        lines += m.lines()
+    lines += gauge_lines("opal_finished_timestamp_seconds", "When the last ingest run wrote these metrics.",
+                         [({}, round(time.time(), 3))])
+    # own names, so they don't clash with the API process's series
+    body = "\n".join(lines).replace("opal_", "opal_ingest_last_run_")
+    tmp.write_text(body + "\n", encoding="utf-8")
+    tmp.replace(path)
+
+
+def stage_totals(pipeline: str) -> Dict[str, Tuple[int, float]]:
+    """{stage: (count, seconds)} recorded in this process, for CLI summaries."""
+    with STAGE_SECONDS._lock:
+        return {dict(k)["stage"]: (s[-1], s[-2]) for k, s in STAGE_SECONDS._series.items()
+                if dict(k).get("pipeline") == pipeline}
+
+
+# --- Timing helpers ---
+
+@contextmanager
+def timed(hist: Histogram = STAGE_SECONDS, **labels) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        hist.observe(time.perf_counter() - t0, **labels)
+
+
+class Stopwatch:
+    """Per-request stage timings in ms (clock.lap("embed") after each stage),
+    also observed into STAGE_SECONDS{pipeline, stage}."""
+
+    def __init__(self, pipeline: str):
+        self.pipeline = pipeline
+        self.start = self.last = time.perf_counter()
+        self.ms: Dict[str, float] = {}
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.add(stage, now - self.last)
+        self.last = now
+
+    def add(self, stage: str, seconds: float):
+        self.ms[stage] = self.ms.get(stage, 0.0) + 1000 * seconds
+        STAGE_SECONDS.observe(seconds, pipeline=self.pipeline, stage=stage)
+
+    def done(self) -> Dict[str, float]:
+        total = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(total, pipeline=self.pipeline, stage="total")
+        return {**self.ms, "total": 1000 * total}
@@ -1,5 +1,29 @@
+import os
+import threading
 from langchain_chroma import Chroma
 from embeddings.get_embedding_function import get_embedding_function
+from vectordb.snapshots import current_index_dir
 
-def get_chroma(persist_directory: str) -> Chroma:
-    return Chroma(persist_directory=persist_directory, embedding_function=get_embedding_function())
+CHROMA_PATH = os.getenv("CHROMA_PATH", "chroma")
+
+_shared: dict = {}
+_shared_lock = threading.Lock()
+
+def get_chroma(persist_directory: str | None = None) -> Chroma:
+    # Resolve the active snapshot on every call so readers follow blue/green swaps.
+    index_dir = current_index_dir(persist_directory or CHROMA_PATH)
+    return Chroma(persist_directory=str(index_dir), embedding_function=get_embedding_function())
+
+def get_shared_chroma(persist_directory: str | None = None) -> Chroma:
+    """
+    One open Chroma handle per active snapshot for long-running processes (API),
+    so HNSW segments are loaded once instead of per request. A snapshot swap
+    opens the new index and drops the old handle.
+    """
+    index_dir = str(current_index_dir(persist_directory or CHROMA_PATH))
+    with _shared_lock:
+        db = _shared.get(index_dir)
+        if db is None:
+            _shared.clear()
+            db = _shared[index_dir] = Chroma(persist_directory=index_dir, embedding_function=get_embedding_function())
+        return db
@@ -0,0 +1,127 @@
+"""
+Blue/green snapshots of the Chroma persist directory.
+
+Layout below ``chroma_path``:
+
+    chroma/
+      CURRENT                 <- name of the active snapshot (swapped atomically)
+      snapshots/<name>/       <- one complete Chroma persist dir + ingest manifest
+
+A tree without a CURRENT file is the legacy layout: ``chroma_path`` itself is
+the index. Readers call ``current_index_dir`` per request, so a finished build
+is picked up without restarting anything.
+"""
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+POINTER_NAME = "CURRENT"
+SNAPSHOTS_DIR = "snapshots"
+MANIFEST_NAME = ".ingest_manifest.json"
+RETIRED_MARKER = ".retired"
+
+DEFAULT_GC_GRACE_SECONDS = 3600
+
+
+def current_index_dir(chroma_path) -> Path:
+    """Directory of the active index (snapshot, or chroma_path for the legacy layout)."""
+    root = Path(chroma_path)
+    try:
+        name = (root / POINTER_NAME).read_text(encoding="utf-8").strip()
+    except (FileNotFoundError, NotADirectoryError):
+        return root
+    cand = root / SNAPSHOTS_DIR / name
+    return cand if name and cand.is_dir() else root
+
+
+def manifest_path(chroma_path) -> Path:
+    return current_index_dir(chroma_path) / MANIFEST_NAME
+
+
+def new_snapshot_dir(chroma_path) -> Path:
+    """Create an empty shadow directory for a full rebuild."""
+    name = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{os.getpid()}"
+    d = Path(chroma_path) / SNAPSHOTS_DIR / name
+    d.mkdir(parents=True, exist_ok=False)
+    return d
+
+
+def _mark_retired(d: Path) -> None:
+    try:
+        (d / RETIRED_MARKER).write_text(str(time.time()), encoding="utf-8")
+    except Exception:
+        pass
+
+
+def activate_snapshot(chroma_path, snapshot_dir: Path) -> None:
+    """Atomically point CURRENT at ``snapshot_dir`` and retire the previous index."""
+    root = Path(chroma_path)
+    snapshot_dir = Path(snapshot_dir)
+    previous = current_index_dir(root)
+
+    tmp = root / (POINTER_NAME + ".tmp")
+    tmp.write_text(snapshot_dir.name, encoding="utf-8")
+    os.replace(tmp, root / POINTER_NAME)  # atomic on POSIX and Windows
+
+    if previous.resolve() != snapshot_dir.resolve():
+        _mark_retired(previous)
+
+
+def discard_snapshot(snapshot_dir: Path) -> None:
+    """Drop a shadow build that never became active (e.g. ingest crashed)."""
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+
+def _retired_at(d: Path) -> float | None:
+    try:
+        return float((d / RETIRED_MARKER).read_text(encoding="utf-8").strip())
+    except Exception:
+        return None
+
+
+def _remove_legacy_files(root: Path) -> None:
+    # Pre-snapshot index data lives directly in chroma_path next to CURRENT/snapshots.
+    for child in root.iterdir():
+        if child.name in (POINTER_NAME, SNAPSHOTS_DIR):
+            continue
+        if child.is_dir() and not child.is_symlink():
+            shutil.rmtree(child)
+        else:
+            child.unlink()
+
+
+def gc_snapshots(chroma_path, grace_seconds: float = DEFAULT_GC_GRACE_SECONDS) -> List[str]:
+    """
+    Delete retired snapshots whose grace period has expired.
+    The grace period gives in-flight queries time to finish on the old index.
+    Returns the names of removed snapshots.
+    """
+    root = Path(chroma_path)
+    active = current_index_dir(root).resolve()
+    now = time.time()
+    removed: List[str] = []
+
+    candidates = [root]
+    snaps = root / SNAPSHOTS_DIR
+    if snaps.is_dir():
+        candidates += [d for d in snaps.iterdir() if d.is_dir()]
+
+    for d in candidates:
+        if d.resolve() == active:
+            continue
+        retired = _retired_at(d)
+        if retired is None or now - retired < grace_seconds:
+            continue
+        try:
+            if d == root:
+                _remove_legacy_files(root)
+            else:
+                shutil.rmtree(d)
+            removed.append(d.name)
+        except Exception as e:
+            # Files may still be open (Windows); try again on the next run.
+            print(f"⚠️ Could not remove retired snapshot {d.name}: {e}")
+    return removed